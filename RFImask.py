@@ -0,0 +1,347 @@
+class PackedMask(object):
+    """Binary RFI mask of shape (frequency, time) stored as packed bits, 8 time samples per byte
+    
+    Masks take 1/8 of the memory of a numpy bool mask (1/64 of a float64 mask), and are combined with bitwise operations
+    on the packed bytes: union (|), intersection (&) and inversion (~). Padding bits at the end of each channel are kept
+    at zero, so counts are exact.
+    
+    Keyword arguments:
+    mask -- Array of shape (frequency, time), non-zero values are flagged (eg. the masks returned by SK or SumThreshold),
+            a PackedMask to copy, or an RLEMask
+    """
+    def __init__(self,mask):
+        import numpy as np
+        
+        if isinstance(mask,PackedMask):
+            self.shape = mask.shape
+            self.bits = mask.bits.copy()
+            return
+        elif isinstance(mask,RLEMask):
+            mask = mask.toBool()
+        
+        mask = np.asarray(mask)
+        if len(np.shape(mask)) != 2:
+            raise ValueError('Mask must be 2-dimensional (frequency, time)')
+        
+        self.shape = np.shape(mask)
+        self.bits = np.packbits(mask != 0,axis=1) # Packed along the time axis, zero padded to a multiple of 8
+    
+    def toBool(self,start=0,stop=None):
+        """Returns the numpy bool mask of the samples start:stop along the time axis (default: all of them)"""
+        import numpy as np
+        
+        if stop is None:
+            stop = self.shape[1]
+        
+        # Unpacking only the bytes which hold the requested samples
+        first = start/8
+        last = (stop+7)/8
+        return np.unpackbits(self.bits[:,first:last],axis=1)[:,start-8*first:stop-8*first].astype(bool)
+    
+    def _clearPadding(self):
+        """Sets the padding bits after the last sample of each channel back to zero"""
+        valid = self.shape[1] % 8
+        if valid != 0:
+            self.bits[:,-1] &= (0xFF << (8-valid)) & 0xFF
+    
+    def _check(self,other):
+        if not isinstance(other,PackedMask):
+            other = PackedMask(other)
+        if other.shape != self.shape:
+            raise ValueError('Masks must have the same shape')
+        return other
+    
+    def union(self,other):
+        """Returns the mask of samples flagged in either mask (also available as mask1 | mask2)"""
+        other = self._check(other)
+        result = PackedMask(self)
+        result.bits |= other.bits
+        return result
+    
+    def intersection(self,other):
+        """Returns the mask of samples flagged in both masks (also available as mask1 & mask2)"""
+        other = self._check(other)
+        result = PackedMask(self)
+        result.bits &= other.bits
+        return result
+    
+    def invert(self):
+        """Returns the mask of unflagged samples (also available as ~mask)"""
+        import numpy as np
+        
+        result = PackedMask(self)
+        np.invert(result.bits,out=result.bits)
+        result._clearPadding()
+        return result
+    
+    __or__ = union
+    __and__ = intersection
+    __invert__ = invert
+    
+    def __eq__(self,other):
+        import numpy as np
+        
+        if not isinstance(other,PackedMask):
+            return NotImplemented
+        return self.shape == other.shape and np.array_equal(self.bits,other.bits)
+    
+    def __ne__(self,other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+    
+    def count(self):
+        """Returns the number of flagged samples"""
+        return int(_popcount()[self.bits].sum(dtype='int64'))
+    
+    def channelOccupancy(self):
+        """Returns the fraction of flagged samples in each channel"""
+        return _popcount()[self.bits].sum(axis=1,dtype='int64')/float(max(self.shape[1],1))
+    
+    def timeOccupancy(self,chunksize=2**6):
+        """Returns the fraction of flagged channels at each time sample, unpacking chunksize channels at a time"""
+        import numpy as np
+        
+        counts = np.zeros(self.shape[1],dtype='int64')
+        for i in range(0,self.shape[0],chunksize):
+            counts += np.unpackbits(self.bits[i:i+chunksize],axis=1)[:,:self.shape[1]].sum(axis=0,dtype='int64')
+        return counts/float(max(self.shape[0],1))
+    
+    def percentflag(self):
+        """Returns the percent of samples flagged"""
+        return 100.*self.count()/max(self.shape[0]*self.shape[1],1)
+    
+    @property
+    def nbytes(self):
+        """Number of bytes used by the packed bits"""
+        return self.bits.nbytes
+
+
+
+class RLEMask(object):
+    """Run-length encoded RFI mask of shape (frequency, time), for archiving and combining the masks of long observations
+    
+    Each run of flagged samples is stored as its channel and its [start, stop) time range, sorted by channel then start. 
+    Narrowband and burst RFI produce long runs, so masks take a few numbers per run instead of a bit per sample. Masks are
+    built block by block with append (runs continuing across block boundaries are merged), combined with union (|) and 
+    intersection (&) by merging run boundaries without expanding to dense, saved to compressed .npz files, and expanded to
+    dense only for the time range requested.
+    
+    Keyword arguments:
+    mask -- (OPTIONAL) Initial block, an array of shape (frequency, time) with non-zero values flagged, a PackedMask, an 
+            RLEMask to copy, or the filename of a mask saved with save (default = None)
+    nchan -- (OPTIONAL) int, number of channels of an empty mask, otherwise taken from the first block (default = None)
+    """
+    def __init__(self,mask=None,nchan=None):
+        import numpy as np
+        
+        self.nchan = nchan
+        self.length = 0 # Number of time samples
+        self.chunks = [] # Runs of every appended block, (channels, starts, stops) arrays, consolidated when needed
+        
+        if isinstance(mask,basestring):
+            saved = np.load(mask)
+            self.nchan,self.length = [int(x) for x in saved['shape']]
+            self.chunks = [(saved['channels'],saved['starts'],saved['stops'])]
+        elif isinstance(mask,RLEMask):
+            self.nchan,self.length = mask.shape
+            self.chunks = [tuple(np.copy(x) for x in mask.runs())]
+        elif mask is not None:
+            self.append(mask)
+    
+    @property
+    def shape(self):
+        return (self.nchan or 0,self.length)
+    
+    def append(self,mask):
+        """Appends a block of shape (frequency, time), dense or a PackedMask, after the current end of the mask"""
+        import numpy as np
+        
+        if isinstance(mask,PackedMask):
+            mask = mask.toBool()
+        mask = np.asarray(mask) != 0
+        if len(np.shape(mask)) != 2:
+            raise ValueError('Mask must be 2-dimensional (frequency, time)')
+        if self.nchan is None:
+            self.nchan = np.shape(mask)[0]
+        elif np.shape(mask)[0] != self.nchan:
+            raise ValueError('Block has a different number of channels than the mask')
+        
+        # Run boundaries are where the padded mask changes, found in channel then time order
+        padded = np.zeros((self.nchan,np.shape(mask)[1]+2),dtype='int8')
+        padded[:,1:-1] = mask
+        edges = np.diff(padded,axis=1)
+        channels,starts = np.nonzero(edges == 1)
+        stops = np.nonzero(edges == -1)[1]
+        starts = starts.astype('int64') + self.length
+        stops = stops.astype('int64') + self.length
+        
+        # Merging the runs which reach the end of the previous block with the runs starting this block, moving them into
+        # this block so runs spanning several blocks are always found in the last one
+        if len(self.chunks) > 0 and len(starts) > 0:
+            prevchannels,prevstarts,prevstops = self.chunks[-1]
+            ending = np.nonzero(prevstops == self.length)[0] # At most one run per channel
+            first = np.nonzero(starts == self.length)[0]
+            iending,ifirst = _match(prevchannels[ending],channels[first])
+            starts[first[ifirst]] = prevstarts[ending[iending]]
+            keep = np.ones(len(prevstarts),dtype=bool)
+            keep[ending[iending]] = False
+            self.chunks[-1] = (prevchannels[keep],prevstarts[keep],prevstops[keep])
+        
+        self.chunks.append((channels.astype('int32'),starts,stops))
+        self.length += np.shape(mask)[1]
+    
+    def runs(self):
+        """Returns the (channels, starts, stops) arrays of all runs, sorted by channel then start"""
+        import numpy as np
+        
+        if len(self.chunks) == 0:
+            return np.zeros(0,dtype='int32'),np.zeros(0,dtype='int64'),np.zeros(0,dtype='int64')
+        if len(self.chunks) > 1:
+            channels,starts,stops = [np.concatenate(x) for x in zip(*self.chunks)]
+            order = np.lexsort((starts,channels))
+            self.chunks = [(channels[order],starts[order],stops[order])]
+        return self.chunks[0]
+    
+    def _combine(self,other,needed):
+        """Returns the runs covered by at least 'needed' of the two masks (1 for the union, 2 for the intersection)"""
+        import numpy as np
+        
+        if not isinstance(other,RLEMask):
+            other = RLEMask(other)
+        if other.shape != self.shape:
+            raise ValueError('Masks must have the same shape')
+        
+        # Sweeping the run boundaries of both masks in order (starts before stops at equal positions, so touching runs
+        # are merged), counting the number of runs covering each position
+        runs1 = self.runs()
+        runs2 = other.runs()
+        channels = np.concatenate((runs1[0],runs2[0],runs1[0],runs2[0]))
+        positions = np.concatenate((runs1[1],runs2[1],runs1[2],runs2[2]))
+        deltas = np.concatenate((np.ones(len(runs1[0])+len(runs2[0]),dtype='int64'),-np.ones(len(runs1[0])+len(runs2[0]),dtype='int64')))
+        order = np.lexsort((-deltas,positions,channels))
+        channels,positions = channels[order],positions[order]
+        inside = np.cumsum(deltas[order]) >= needed
+        before = np.concatenate(([False],inside[:-1]))
+        
+        starts = positions[inside & ~before]
+        stops = positions[~inside & before]
+        channels = channels[inside & ~before]
+        keep = stops > starts # Dropping empty runs, eg. the intersection of touching runs
+        
+        result = RLEMask(nchan=self.nchan)
+        result.length = self.length
+        result.chunks = [(channels[keep],starts[keep],stops[keep])]
+        return result
+    
+    def union(self,other):
+        """Returns the mask of samples flagged in either mask (also available as mask1 | mask2), other may be dense or packed"""
+        return self._combine(other,1)
+    
+    def intersection(self,other):
+        """Returns the mask of samples flagged in both masks (also available as mask1 & mask2), other may be dense or packed"""
+        return self._combine(other,2)
+    
+    __or__ = union
+    __and__ = intersection
+    
+    def toBool(self,start=0,stop=None):
+        """Returns the numpy bool mask of the samples start:stop along the time axis (default: all of them), expanding 
+        only the runs which overlap that range
+        """
+        import numpy as np
+        
+        if stop is None:
+            stop = self.length
+        
+        channels,starts,stops = self.runs()
+        overlap = (starts < stop) & (stops > start)
+        
+        # Marking the start and stop of every run in the range, and filling between them with a cumulative sum
+        edges = np.zeros((self.nchan or 0,stop-start+1),dtype='int32')
+        np.add.at(edges,(channels[overlap],np.maximum(starts[overlap],start)-start),1)
+        np.add.at(edges,(channels[overlap],np.minimum(stops[overlap],stop)-start),-1)
+        return np.cumsum(edges,axis=1)[:,:-1] > 0
+    
+    def count(self):
+        """Returns the number of flagged samples"""
+        channels,starts,stops = self.runs()
+        return int((stops - starts).sum())
+    
+    def channelOccupancy(self):
+        """Returns the fraction of flagged samples in each channel"""
+        import numpy as np
+        
+        channels,starts,stops = self.runs()
+        return np.bincount(channels,weights=stops-starts,minlength=self.nchan or 0)/float(max(self.length,1))
+    
+    def percentflag(self):
+        """Returns the percent of samples flagged"""
+        return 100.*self.count()/max(self.shape[0]*self.shape[1],1)
+    
+    def save(self,filename):
+        """Saves the runs to a compressed .npz file, which RLEMask(filename) loads"""
+        import numpy as np
+        
+        channels,starts,stops = self.runs()
+        np.savez_compressed(filename,channels=channels,starts=starts,stops=stops,shape=np.array(self.shape))
+
+
+
+def combineMasks(masks,intersection=False):
+    """Combines the masks of several flaggers (eg. SK, SumThreshold, upchannelize) into one
+    
+    The masks may be dense arrays, PackedMask or RLEMask in any mix, and the result has the format of the first mask
+    (dense masks are combined with array operations, the other formats with their own set operations).
+    
+    Keyword arguments:
+    masks -- List of masks of the same shape (frequency, time)
+    intersection -- boolean, if True, flags the samples flagged in every mask instead of in any mask (default = False)
+    """
+    import numpy as np
+    
+    if len(masks) == 0:
+        raise ValueError('No masks to combine')
+    
+    combined = masks[0]
+    if not isinstance(combined,(PackedMask,RLEMask)):
+        combined = np.asarray(combined) != 0
+    for mask in masks[1:]:
+        if isinstance(combined,(PackedMask,RLEMask)):
+            combined = combined & mask if intersection == True else combined | mask
+        else:
+            if isinstance(mask,(PackedMask,RLEMask)):
+                mask = mask.toBool()
+            combined = combined & (np.asarray(mask) != 0) if intersection == True else combined | (np.asarray(mask) != 0)
+    
+    return combined
+
+
+
+def _match(a,b):
+    """Returns the indices into a and b of the values present in both (the values are unique in each)"""
+    import numpy as np
+    
+    values = np.concatenate((a,b))
+    order = np.argsort(values,kind='mergesort')
+    sortedvalues = values[order]
+    same = np.nonzero(sortedvalues[1:] == sortedvalues[:-1])[0]
+    first,second = order[same],order[same+1] # Stable sort, so the index into a comes first
+    return first,second-len(a)
+
+
+
+# Table of the number of set bits in every byte value, built on first use
+_table = []
+
+
+
+def _popcount():
+    """Returns the table of the number of set bits of the 256 byte values"""
+    import numpy as np
+    
+    if len(_table) == 0:
+        _table.append(np.unpackbits(np.arange(256,dtype='uint8')[:,np.newaxis],axis=1).sum(axis=1).astype('uint8'))
+    return _table[0]
+
@@ -0,0 +1,88 @@
+def SIR(mask,eta=0.2,axis='both',chunksize=2**6):
+    """Returns a mask dilated with the scale-invariant rank (SIR) operator of A. Offringa et al. (2012)
+    
+    A sample is flagged if it lies in some interval in which at least a fraction (1 - eta) of the samples are flagged, so
+    flags grow around detected RFI in proportion to its extent. With weights eta for flagged and eta - 1 for unflagged
+    samples, and W the cumulative sum of the weights, sample y is flagged if max(W[Y2], Y2 > y) - min(W[Y1], Y1 <= y) >= 0,
+    which is evaluated for every row at once with cumulative maxima and minima, in linear time per row.
+    
+    Keyword arguments:
+    mask -- Mask of shape (frequency, time) returned by a flagger (eg. SK or SumThreshold), dense, or a PackedMask or
+            RLEMask (see RFImask); the result has the same format
+    eta -- Float, aggressiveness of the operator, 0 leaves the mask unchanged and larger values grow the flags further
+           (default = 0.2)
+    axis -- Which axis to dilate along, axis = 0 is the frequency-axis, axis = 1 is the time-axis and 'both' dilates
+            along the time axis, then along the frequency axis (default = 'both')
+    chunksize -- Number of rows processed at once, to bound the memory of the cumulative sums (default = 2**6)
+    
+    """
+    print 'Beginning SIR operator...'
+    
+    # Importing required modules
+    import numpy as np
+    from RFImask import PackedMask, RLEMask
+    
+    if not 0 <= eta < 1:
+        raise ValueError('Eta must be in [0, 1)')
+    elif axis not in (0,1,'both'):
+        raise ValueError("Axis must be 0, 1 or 'both'")
+    
+    # Working on a bool copy of the mask, whatever its format
+    fmt = type(mask)
+    if isinstance(mask,(PackedMask,RLEMask)):
+        flagged = mask.toBool()
+    else:
+        dtype = np.asarray(mask).dtype
+        flagged = np.asarray(mask) != 0
+    
+    if axis in (1,'both'): # Along the time axis, each channel is a row
+        flagged = SIRRows(flagged,eta,chunksize)
+    if axis in (0,'both'): # Along the frequency axis, each spectrum is a row
+        flagged = np.transpose(SIRRows(np.transpose(flagged),eta,chunksize))
+    
+    print 'Percent flagged after SIR operator: ', np.mean(flagged)*100
+    print 'Finished SIR operator.'
+    
+    # Returning the mask in the format it was given
+    if fmt is PackedMask:
+        return PackedMask(flagged)
+    elif fmt is RLEMask:
+        return RLEMask(flagged)
+    return flagged.astype(dtype)
+
+
+
+def SIRRows(flagged,eta=0.2,chunksize=2**6):
+    """Applies the SIR operator along the rows of a bool mask, and returns the dilated bool mask
+    
+    Keyword arguments:
+    flagged -- Bool array of shape (rows, samples), True where flagged
+    eta -- Float, aggressiveness of the operator (default = 0.2)
+    chunksize -- Number of rows processed at once (default = 2**6)
+    """
+    # Importing required modules
+    import numpy as np
+    
+    dims = np.shape(flagged)
+    dilated = np.zeros(dims,dtype=bool)
+    if dims[1] == 0:
+        return dilated
+    
+    tol = 1E-9*dims[1] # Tolerance on the cumulative sums, so intervals exactly at the (1 - eta) fraction are flagged
+    
+    for i in range(0,dims[0],chunksize):
+        rows = flagged[i:i+chunksize]
+        
+        # Cumulative sums of the weights, with W[:,0] = 0 before the first sample
+        weights = np.where(rows,eta,eta-1.)
+        W = np.zeros((np.shape(rows)[0],dims[1]+1))
+        np.cumsum(weights,axis=1,out=W[:,1:])
+        
+        # Smallest W at or before each sample, and largest W after it
+        prefmin = np.minimum.accumulate(W[:,:-1],axis=1)
+        sufmax = np.maximum.accumulate(W[:,:0:-1],axis=1)[:,::-1]
+        
+        dilated[i:i+chunksize] = sufmax - prefmin >= -tol
+    
+    return dilated
+
@@ -1,38 +1,296 @@
-def SK(data,V4,M=128,upper=1.5,lower=0.6):
+def SK(data,V4=None,M=128,upper=1.5,lower=0.6,level=0,precision='double',pfa=None,packed=False):
     """Returns a binary mask of flagged RFI using the Spectral Kurtosis (SK) algorithm
     
+    With the hand-tuned limits (pfa = None), the estimator is the original ((M+1)/(M-1))*(M*V4/data**2 - 1), in which
+    (M+1)/(M-1) is 1 for an integer M under Python 2 integer division, so the masks are the same as those of the original 
+    SK. With pfa, the estimator is the unbiased ((M+1.)/(M-1.))*(M*V4/data**2 - 1) the limits of SKthresholds apply to, 
+    which is also the estimator of SKmulti and SKStream.
+    
     Keyword arguments:
     data -- Input data set (in terms of power ie. |V|^2)
     V4 -- Data set squared (power squared), if the data-set has been decimated, this must also be decimated with the same factor 
     M -- Number of pixels summed together (default = 128)
     upper -- The upper limit on the spectral kurtosis for thresholding (value around ~1.5 for M=128 seems to work well)
     lower -- The lower limit on the spectral kurtosis for thresholding (value around ~0.6 for M=128 seems to work well)
+    level -- (OPTIONAL) If data is a Pyramid from decimate, the level to use, V4 and M are then taken from the pyramid, which 
+             must be a stack whose first two quantities are S1 and S2 (default = 0)
+    precision -- (OPTIONAL) Precision policy setting the dtype of the SK estimator and of the mask, 'double', 'single' or 
+                 'integer', see precision.precision (default = 'double')
+    pfa -- (OPTIONAL) False-alarm probability, if given the upper and lower limits are looked up for M with SKthresholds
+           instead of using the values of upper and lower; they are quantiles of the (M+1)/(M-1)-scaled estimator 
+           computed here, so the fraction of clean pixels flagged on each side is pfa (default = None)
+    packed -- (OPTIONAL) boolean, if True, returns the mask as packed bits (see RFImask.PackedMask) (default = False)
     
     """
     print 'Beginning SK...'
     
     import numpy as np
+    from decimate import Pyramid
+    from precision import precision as dtypes
+    
+    policy = dtypes(precision)
+    
+    # Taking the power and power squared of the first polarization, and the number of pixels summed, from a pyramid level
+    if isinstance(data,Pyramid):
+        if np.ndim(data.level(level)) != 3 or np.shape(data.level(level))[0] < 2:
+            raise ValueError('Pyramid must be a stack of (S1, S2, ...) such as the output of decimateStack')
+        M = data.factor(level)
+        data,V4 = data.level(level)[:2]
+    
+    # Looking up the limits for this number of summed pixels
+    if pfa is not None:
+        from SKthresholds import SKthresholds
+        lower,upper = SKthresholds(M,pfa=pfa)
     
     # Defining required variables
     dims = np.shape(data) #Dimensions of reduced array for later use
     eps = 1E-5 #small value to add to arrays to negate divide by zero errors
     
     # Creating mask with same dimensions as input data 
-    kurtmask = np.zeros_like(data)
+    kurtmask = np.zeros(dims,dtype=policy['mask'])
+    
+    # Computing the estimator in the floating point precision of the policy (exact integer sums are converted here)
+    data = np.asarray(data,dtype=policy['float'])
+    V4 = np.asarray(V4,dtype=policy['float'])
+    
+    # Scaling of the estimator, the original integer division for the hand-tuned limits (1 for an integer M), so their 
+    # masks are unchanged, and the unbiased factor for the limits looked up with SKthresholds
+    if pfa is None:
+        factor = (M+1)/(M-1)
+    else:
+        factor = (M+1.)/(M-1.)
     
     #Differencing kurtosis and squared second moment
-    Speckurt = ((M+1)/(M-1))*(M*(V4+eps)/((data**2)+eps)-1)
-    
-    #Loop to do the thresholding
-    for y in range(dims[0]):
-        for x in range(dims[1]):
-            if Speckurt[y][x] > upper or Speckurt[y][x] < lower:
-                kurtmask[y][x] = 1
-            else:
-                continue
+    Speckurt = factor*(M*(V4+eps)/((data**2)+eps)-1)
+    
+    # Thresholding every pixel at once
+    kurtmask[(Speckurt > upper) | (Speckurt < lower)] = 1
                         
     percentflag = np.mean(kurtmask)*100 # Percent of data flagged by SK algorithm 
     print 'Percent flagged by SK algorithm: ', percentflag
     print 'Finished SK.'
     
-    return kurtmask
\ No newline at end of file
+    if packed == True:
+        from RFImask import PackedMask
+        return PackedMask(kurtmask)
+    
+    return kurtmask
+
+
+
+def SKmulti(data,V4=None,M=128,scales=(128,512,2048),upper=None,lower=None,pfa=0.0013499,level=0,precision='double',packed=False):
+    """Returns stacked binary masks of flagged RFI using the Spectral Kurtosis (SK) algorithm at several accumulation lengths
+    
+    The power and power squared sums at each scale are built hierarchically, each from the sums of the previous scale 
+    (or taken directly from the levels of a Pyramid), and every scale is thresholded with array comparisons. The mask of 
+    each scale is expanded back to the time resolution of the input, so the output has shape (scales, frequency, time).
+    
+    Keyword arguments:
+    data -- Input data set (in terms of power ie. |V|^2), or a Pyramid from decimate
+    V4 -- Data set squared (power squared), decimated with the same factor as data (not needed for a Pyramid)
+    M -- Number of pixels summed together in the input data (default = 128)
+    scales -- List of accumulation lengths to evaluate, each a multiple of M and of the previous scale (default = (128,512,2048))
+    upper -- (OPTIONAL) List of upper SK limits, one per scale, None looks them up with SKthresholds (default = None)
+    lower -- (OPTIONAL) List of lower SK limits, one per scale, None looks them up with SKthresholds (default = None)
+    pfa -- False-alarm probability used to look up limits which are not given (default = 0.0013499, ie. 3 sigma)
+    level -- (OPTIONAL) If data is a Pyramid from decimate, the level used as the input, V4 and M are then taken from the 
+             pyramid, which must be a stack whose first two quantities are S1 and S2 (default = 0)
+    precision -- (OPTIONAL) Precision policy setting the dtype of the SK estimator and of the masks, 'double', 'single' or 
+                 'integer', see precision.precision (default = 'double')
+    packed -- (OPTIONAL) boolean, if True, returns a list of one packed mask per scale instead of the stacked array (see RFImask.PackedMask) (default = False)
+    
+    Returns: 
+    masks -- Array of shape (scales, frequency, time), the mask of each scale at the time resolution of the input
+    percentflag -- Array, percent of data flagged at each scale
+    """
+    print 'Beginning multi-scale SK...'
+    
+    import numpy as np
+    from decimate import Pyramid
+    from precision import precision as dtypes
+    from SKthresholds import SKthresholds
+    
+    policy = dtypes(precision)
+    
+    pyramid = None
+    if isinstance(data,Pyramid):
+        pyramid = data
+        if np.ndim(pyramid.level(level)) != 3 or np.shape(pyramid.level(level))[0] < 2:
+            raise ValueError('Pyramid must be a stack of (S1, S2, ...) such as the output of decimateStack')
+        M = pyramid.factor(level)
+        data,V4 = pyramid.level(level)[:2]
+    
+    dims = np.shape(data)
+    eps = 1E-5 #small value to add to arrays to negate divide by zero errors
+    
+    # Conditions checking that the scales can be built from one another
+    factors = [scales[0]/M] + [scales[i]/scales[i-1] for i in range(1,len(scales))]
+    for i in range(len(scales)):
+        previous = M if i == 0 else scales[i-1]
+        if scales[i] % previous != 0:
+            raise ValueError('Each scale must be a multiple of M and of the previous scale')
+    if dims[1] % (scales[-1]/M) != 0:
+        raise ValueError('Largest scale is not a proper fraction of the data length')
+    
+    masks = np.zeros((len(scales),) + dims,dtype=policy['mask'])
+    percentflag = np.zeros(len(scales))
+    
+    S1 = np.asarray(data,dtype=policy['float'])
+    S2 = np.asarray(V4,dtype=policy['float'])
+    for i,Ms in enumerate(scales):
+        # Combining the accumulations of the previous scale, or taking them from the pyramid
+        if pyramid is not None and Ms in [pyramid.factor(k) for k in range(pyramid.levels+1)]:
+            S1,S2 = [np.asarray(x,dtype=policy['float']) for x in pyramid.level(pyramid.find(Ms))[:2]]
+        elif factors[i] > 1:
+            S1 = S1.reshape(dims[0],-1,factors[i]).sum(axis=2)
+            S2 = S2.reshape(dims[0],-1,factors[i]).sum(axis=2)
+        
+        # Limits of the estimator for this scale, looked up when not given
+        low,up = SKthresholds(Ms,pfa=pfa)
+        if upper is not None:
+            up = upper[i]
+        if lower is not None:
+            low = lower[i]
+        
+        Speckurt = ((Ms+1.)/(Ms-1.))*(Ms*(S2+eps)/((S1**2)+eps)-1)
+        flagged = (Speckurt > up) | (Speckurt < low)
+        
+        # Expanding the mask of this scale back to the time resolution of the input
+        masks[i] = np.repeat(flagged,Ms/M,axis=1)
+        percentflag[i] = np.mean(flagged)*100
+        print 'Percent flagged by SK algorithm with M =', Ms, ':', percentflag[i]
+    
+    print 'Finished multi-scale SK.'
+    
+    if packed == True:
+        from RFImask import PackedMask
+        return [PackedMask(mask) for mask in masks],percentflag
+    
+    return masks,percentflag
+
+
+class SKStream(object):
+    """Online Spectral Kurtosis flagger which consumes raw voltage blocks and emits mask columns as each window completes
+    
+    Running sums of power and power squared are kept per channel, and carried across block boundaries, so windows of M
+    samples which straddle two blocks are evaluated exactly as if the data were contiguous. Each call to update returns
+    the mask of the windows completed by that block, so the latency is one window rather than one file. Blocks should not
+    overlap (eg. dataStream or Prefetcher with overlap = 0).
+    
+    Keyword arguments:
+    M -- Number of voltage samples summed into each SK pixel (default = 128)
+    polar -- Index of the polarization to flag for 3-dimensional blocks (eg. 0 or -1), None for 2-dimensional blocks (default = 0)
+    pfa -- False-alarm probability used to look up the limits with SKthresholds (default = 0.0013499, ie. 3 sigma)
+    upper -- (OPTIONAL) Upper limit on the spectral kurtosis, overrides the looked up value (default = None)
+    lower -- (OPTIONAL) Lower limit on the spectral kurtosis, overrides the looked up value (default = None)
+    chunksize -- Number of time samples processed at once when decimating a block (default = 2**13)
+    precision -- (OPTIONAL) Precision policy of the sums and mask, 'double', 'single' or 'integer', see precision.precision
+                 (default = 'double')
+    packed -- (OPTIONAL) boolean, if True, update returns the masks as packed bits (see RFImask.PackedMask) (default = False)
+    """
+    def __init__(self,M=128,polar=0,pfa=0.0013499,upper=None,lower=None,chunksize=2**13,precision='double',packed=False):
+        from SKthresholds import SKthresholds
+        from precision import precision as dtypes
+        
+        self.M = M
+        self.polar = polar
+        self.chunksize = chunksize
+        self.precision = precision
+        self.policy = dtypes(precision)
+        self.packed = packed
+        
+        # Limits of the estimator, looked up once for the whole stream
+        self.lower,self.upper = SKthresholds(M,pfa=pfa)
+        if upper is not None:
+            self.upper = upper
+        if lower is not None:
+            self.lower = lower
+        
+        self.reset()
+    
+    def reset(self):
+        """Discards the running sums of an incomplete window and the flagging statistics"""
+        self.S1 = None # Running sums of the incomplete window, per channel
+        self.S2 = None
+        self.n = 0 # Number of samples in the incomplete window
+        self.nwindows = 0 # Number of windows evaluated so far
+        self.nflagged = 0 # Number of pixels flagged so far
+    
+    def update(self,block):
+        """Adds a block of voltages of shape (time, frequency, polarization) or (time, frequency) to the running sums, and
+        returns the mask of shape (frequency, windows) of every window completed by this block (possibly zero windows)
+        """
+        import numpy as np
+        from decimate import powerSums
+        
+        timelen = np.shape(block)[0]
+        nfreqs = np.shape(block)[1]
+        if self.S1 is None:
+            self.S1 = np.zeros(nfreqs,dtype=self.policy['sums'])
+            self.S2 = np.zeros(nfreqs,dtype=self.policy['sums'])
+        
+        S1s = []
+        S2s = []
+        
+        # Completing the window carried over from the previous block
+        start = 0
+        if self.n > 0:
+            start = min(self.M - self.n,timelen)
+            if start > 0:
+                head1,head2 = powerSums(block[:start],start,polar=self.polar,precision=self.precision)
+                self.S1 += head1[:,0]
+                self.S2 += head2[:,0]
+                self.n += start
+            if self.n == self.M:
+                S1s.append(self.S1[:,np.newaxis].copy())
+                S2s.append(self.S2[:,np.newaxis].copy())
+                self.S1[:] = 0
+                self.S2[:] = 0
+                self.n = 0
+        
+        # Windows lying entirely within this block
+        nfull = (timelen - start)/self.M
+        if nfull > 0:
+            full1,full2 = powerSums(block[start:start+nfull*self.M],self.M,polar=self.polar,chunksize=self.chunksize,precision=self.precision)
+            S1s.append(full1)
+            S2s.append(full2)
+        
+        # Starting the next window with the remaining samples
+        tail = start + nfull*self.M
+        if tail < timelen:
+            tail1,tail2 = powerSums(block[tail:],timelen-tail,polar=self.polar,precision=self.precision)
+            self.S1 += tail1[:,0]
+            self.S2 += tail2[:,0]
+            self.n += timelen - tail
+        
+        if len(S1s) == 0:
+            kurtmask = np.zeros((nfreqs,0),dtype=self.policy['mask'])
+            if self.packed == True:
+                from RFImask import PackedMask
+                return PackedMask(kurtmask)
+            return kurtmask
+        
+        # Thresholding the completed windows
+        M = self.M
+        eps = 1E-5 #small value to add to arrays to negate divide by zero errors
+        S1 = np.concatenate(S1s,axis=1).astype(self.policy['float'])
+        S2 = np.concatenate(S2s,axis=1).astype(self.policy['float'])
+        Speckurt = ((M+1.)/(M-1.))*(M*(S2+eps)/((S1**2)+eps)-1)
+        
+        kurtmask = np.zeros(np.shape(S1),dtype=self.policy['mask'])
+        kurtmask[(Speckurt > self.upper) | (Speckurt < self.lower)] = 1
+        
+        self.nwindows += np.size(kurtmask)
+        self.nflagged += np.count_nonzero(kurtmask)
+        
+        if self.packed == True:
+            from RFImask import PackedMask
+            return PackedMask(kurtmask)
+        
+        return kurtmask
+    
+    def percentflag(self):
+        """Returns the percent of pixels flagged since the stream was started or reset"""
+        if self.nwindows == 0:
+            return 0.
+        return 100.*self.nflagged/self.nwindows
@@ -0,0 +1,86 @@
+def SKthresholds(M, N=1, d=1, pfa=0.0013499, cachefile=None):
+    """Returns the lower and upper Spectral Kurtosis thresholds for a given accumulation length and false-alarm probability
+    
+    The first four moments of the generalized SK estimator (Nita & Gary 2010) are computed exactly for the given M, N and d,
+    and the distribution is modelled by the Pearson curve with those moments (type IV or VI for the usual M, type I or III
+    otherwise). The thresholds are the quantiles of that curve at pfa and 1 - pfa. Results are memoized in memory and in a 
+    small JSON table on disk, so after the first computation a lookup costs O(1) per block. The model is accurate for the 
+    upper threshold for M >= 64, the lower threshold is slightly conservative for M ~ 128 (eg. M = 128, pfa = 0.0013499 
+    gives lower = 0.602, upper = 1.763). Only the lower threshold matches the hand-tuned 0.6 used by SK; the hand-tuned 
+    upper limit of 1.5 is about 0.26 tighter and flags about 0.9% of clean pixels, ie. a false-alarm probability roughly 
+    seven times larger than pfa.
+    
+    The thresholds are quantiles of the unbiased estimator ((M*N*d+1)/(M-1))*(M*S2/S1**2 - 1), ie. 
+    ((M+1.)/(M-1.))*(M*S2/S1**2 - 1) for ARO data, which is the statistic computed by SKmulti, SKStream and SK when 
+    given pfa. They do not apply to the estimator without the (M+1)/(M-1) factor.
+    
+    Keyword arguments:
+    M -- int, number of spectra accumulated in each pixel (ie. the decimation factor)
+    N -- int, number of spectra averaged on board before accumulation (default = 1 for ARO raw voltages)
+    d -- Float, shape factor of the gamma distribution of the power, 1 for complex voltages, 0.5 for real ones (default = 1)
+    pfa -- Float, false-alarm probability of each threshold, ie. fraction of clean data flagged on each side 
+           (default = 0.0013499, the equivalent of 3 sigma for a Gaussian)
+    cachefile -- String, path of the on-disk table, None uses ~/.aro_rfi/SKthresholds.json (default = None)
+    
+    """
+    # Importing required modules
+    import numpy as np
+    from tablecache import cachePath, cacheLookup, cacheStore
+    
+    if cachefile is None:
+        cachefile = cachePath('SKthresholds.json')
+    
+    key = '%d,%d,%r,%r'%(M, N, float(d), float(pfa))
+    cached = cacheLookup(cachefile, key)
+    if cached is not None:
+        return tuple(cached)
+    
+    if M < 2:
+        raise ValueError('M must be at least 2')
+    elif pfa <= 0 or pfa >= 0.5:
+        raise ValueError('False-alarm probability must be between 0 and 0.5')
+    
+    # Exact central moments of the generalized SK estimator
+    M = float(M)
+    Nd = N*d
+    x = M*Nd
+    mu2 = 2*M**2*Nd*(1 + Nd)/((M - 1)*(2 + x)*(3 + x))
+    mu3 = 8*M**3*Nd*(1 + Nd)*(-2 + Nd*(-5 + M*(4 + Nd)))/((M - 1)**2*(2 + x)*(3 + x)*(4 + x)*(5 + x))
+    mu4 = (12*M**4*Nd*(1 + Nd)*(24 + Nd*(48 + 84*Nd + M*(-32 + Nd*(-245 - 93*Nd + M*(125 + Nd*(68 + M + (3 + M)*Nd))))))
+           /((M - 1)**3*(2 + x)*(3 + x)*(4 + x)*(5 + x)*(6 + x)*(7 + x)))
+    
+    # Coefficients of the Pearson differential equation p'(y)/p(y) = -(c1 + y)/(c0 + c1*y + c2*y**2), y = SK - 1
+    beta1 = mu3**2/mu2**3
+    beta2 = mu4/mu2**2
+    denom = 10*beta2 - 12*beta1 - 18
+    c0 = mu2*(4*beta2 - 3*beta1)/denom
+    c1 = np.sign(mu3)*np.sqrt(mu2*beta1)*(beta2 + 3)/denom
+    c2 = (2*beta2 - 3*beta1 - 6)/denom
+    
+    # Support of the curve, bounded by the real roots of the denominator on either side of the mean
+    sigma = np.sqrt(mu2)
+    low, high = -60*sigma, 60*sigma
+    if abs(c2) > 1E-12:
+        roots = np.roots([c2, c1, c0])
+        roots = roots[np.isreal(roots)].real
+    else:
+        roots = np.array([-c0/c1])
+    if len(roots[roots < 0]) > 0:
+        low = max(low, roots[roots < 0].max())
+    if len(roots[roots > 0]) > 0:
+        high = min(high, roots[roots > 0].min())
+    
+    # Integrating the log-density, then the density, on a fine grid and inverting the cumulative distribution
+    y = np.linspace(low, high, 200001)[1:-1]
+    dlogp = -(c1 + y)/(c0 + c1*y + c2*y**2)
+    logp = np.concatenate(([0.], np.cumsum(0.5*(dlogp[1:] + dlogp[:-1])*np.diff(y))))
+    p = np.exp(logp - logp.max())
+    cdf = np.concatenate(([0.], np.cumsum(0.5*(p[1:] + p[:-1])*np.diff(y))))
+    cdf /= cdf[-1]
+    
+    thresholds = (1 + float(np.interp(pfa, cdf, y)), 1 + float(np.interp(1 - pfa, cdf, y)))
+    
+    # Storing in memory and in the on-disk table
+    cacheStore(cachefile, key, thresholds, name='SK threshold table')
+    
+    return thresholds
@@ -1,116 +1,86 @@
-def SumThreshold(data,axis='both'):
+def SumThreshold(data,axis='both',decfactor=128,level=0,precision='double',mode='aligned',iterations=None,workers=1,processes=False,packed=False):
     """Returns a binary mask of flagged RFI using A. Offringa's SumThreshold method. 
     
-    Uses exponentially increasing subsequence lengths (2**i) to speed up performance. Thresholds are calculated based on a shifted and scaled Chi-squared distribution.
+    Uses exponentially increasing subsequence lengths (2**i) to speed up performance. Thresholds are calculated based on a shifted and scaled Chi-squared distribution, using tabulated reference statistics (see chi2table).
     
     Keyword arguments:
     data -- Input data set (in terms of power ie. |V|^2)
     axis -- Which axis to perform the flagging along, axis = 0 is the frequency-axis, axis = 1 is the time-axis
             and 'both' will run along each axis independently, then combine the masks (default axis = 'both')
+    decfactor -- Factor by which the input data has been decimated, which sets the degrees of freedom of each pixel (default = 128)
+    level -- (OPTIONAL) If data is a Pyramid from decimate, the level to flag, decfactor is then taken from the pyramid (default = 0)
+    precision -- (OPTIONAL) Precision policy setting the dtype of the working copy of the data and of the masks, 'double', 
+                 'single' or 'integer', see precision.precision (default = 'double')
+    mode -- (OPTIONAL) 'aligned' tests non-overlapping windows aligned to multiples of the sub-sequence length, 'sliding' 
+            tests windows at every position using cumulative sums (Offringa's sliding-window variant), which catches 
+            bursts straddling window boundaries at a cost of O(N) per window length (default = 'aligned')
+    iterations -- (OPTIONAL) int, sub-sequence lengths 2**0 to 2**iterations are tested, None uses 7 for a single axis
+                  and 6 for each axis with axis = 'both' (default = None)
+    workers -- (OPTIONAL) int, number of threads or processes to split the channels (and, with axis = 'both', the two
+               axis passes) across, see SumThresholdParallel (default = 1)
+    processes -- (OPTIONAL) boolean, if True, uses a process pool over shared-memory arrays instead of a thread pool 
+                 (default = False)
+    packed -- (OPTIONAL) boolean, if True, returns the mask as packed bits, and combines the masks of axis = 'both' 
+              with a bitwise or (see RFImask.PackedMask) (default = False)
     
     """
     print 'Beginning SumThreshold...'
     
     # Importing required modules
     import numpy as np
-    from scipy.stats import chi2
+    from decimate import Pyramid
+    from precision import precision as dtypes
+    from RFImask import PackedMask
     
-    # Creating a copy of the input data
-    rawdata = np.copy(data) 
+    policy = dtypes(precision)
+    
+    # Taking the power of the first polarization, and its decimation factor, from a pyramid level
+    if isinstance(data,Pyramid):
+        decfactor = data.factor(level)
+        data = data.level(level)
+        if len(np.shape(data)) == 3:
+            data = data[0]
+    
+    # Creating a copy of the input data (floating point, as flagged values are replaced by window means)
+    rawdata = np.array(data,dtype=policy['float']) 
 
     # Creating an initial mask of zeros to contain flagged values 
-    Threshmask = np.zeros_like(data) 
+    Threshmask = np.zeros(np.shape(data),dtype=policy['mask']) 
     
     if axis == 0: # Running the algorithm along the frequency axis
         flipped = np.transpose(np.copy(rawdata))# Flipping the input data and mask for easier looping
         flippedmask = np.transpose(np.copy(Threshmask))
         
-        dims = np.shape(flipped) #Dimensions of input array
-        
         # Calulating the number of iterations based on the length of the input data (in exponential factors of 2)
-        iterations = 7 #If full number of iterations is desired, use: np.int(np.log(dims[1])/np.log(2))
+        if iterations is None:
+            iterations = 7 #If full number of iterations is desired, use: np.int(np.log(dims[1])/np.log(2))
         
-        thresholds = [] # Storing the base threshold for each column, to calculate subsequent thresholds
-        for i in range(iterations+1): # Loop to iterate several times and to increase sub-sequence lengths
-            sublen = 2**i
-            print 'Testing Sub-sequence length: ', sublen
-            dof = 2*128*sublen # Degrees of freedom, 256 per pixel (128 pixels summed into one, each with Re and Im components)
-            basechi = chi2(dof).rvs(size=1E5) # Calculating a base chi-squared distribution (not scaled or shifted)
-            med_chi = np.median(basechi) # Median of chi-sq distribution
-            mad_chi = np.median(np.abs(basechi - med_chi)) # MAD of chi-sq distribution
-            sumdata = np.reshape(flipped, (dims[0],dims[1]/sublen,sublen)).sum(axis=2)
-            for j in range(dims[0]): # Iterating along the columns and flagging in each one
-                col = flipped[j] 
-                sumcol = sumdata[j]
-                med = np.median(sumcol) # Median of channel
-                mad = np.median(np.abs(sumcol-med)) # Median absolute deviation (MAD) of channel
-                offset = med - med_chi * (mad/mad_chi)
-                chidist = chi2(dof,scale = mad/mad_chi, loc=offset)
-                thresh = chidist.ppf(1-(1E-15))
-                 
-                for k in np.arange(0,len(col),sublen): # Loop to slide window along freq channels
-                    window = np.copy(col[k:k+sublen])
-                    for l in range(len(window)):  # Loop to set values which have been previously flagged as zero to later calculate the mean of the window
-                        if flippedmask[j][k+l] == 1:
-                            window[l] = 0
-                    windowsum = np.sum(window)
-                    nonzeros = len(np.nonzero(window)[0]) # Counting the number of non-zero values
-                    windowmean = windowsum/nonzeros
-                    for m in range(len(window)):
-                        if flippedmask[j][k+m] == 1:
-                            window[m] = windowmean
-                    windowthresh = np.sum(window)
-                    flipped[j][k:k+sublen] = window # Setting the values in the data set to the values of the window
-
-                    if windowthresh > thresh: # If the average of the window is greater than the threshold, flag all values inside
-                        flippedmask[j][k:k+sublen] = 1
+        if workers > 1:
+            SumThresholdParallel([(flipped,flippedmask,1.)],iterations,decfactor,mode,workers,processes)
+        else:
+            SumThresholdRows(flipped,flippedmask,iterations,decfactor=decfactor,mode=mode)
         
         # Flipping the mask back to its original orientation
         reflippedmask = np.transpose(flippedmask)
         
+        if packed == True:
+            return PackedMask(reflippedmask)
+        
         return reflippedmask
     
     elif axis == 1: # Running the algorithm along the time axis 
-       
-        #Dimensions of input array
-        dims = np.shape(rawdata) 
         
         # Calulating the number of iterations based on the length of the input data (in exponential factors of 2)
-        iterations = 7 #If full number of iterations is desired, use: np.int(np.log(dims[1])/np.log(2))
+        if iterations is None:
+            iterations = 7 #If full number of iterations is desired, use: np.int(np.log(dims[1])/np.log(2))
         
-        for i in range(iterations+1): # Loop to iterate several times and to increase sub-sequence lengths ('sublen' variable)
-            sublen = 2**i
-            print 'Testing Sub-sequence length: ', sublen
-            dof = 2*128*sublen # Degrees of freedom, 256 per pixel (128 pixels summed into one, each with Re and Im components)
-            basechi = chi2(dof).rvs(size=1E5) # Calculating a base chi-squared distribution (not scaled or shifted)
-            med_chi = np.median(basechi) # Median of chi-sq distribution
-            mad_chi = np.median(np.abs(basechi - med_chi)) # MAD of chi-sq distribution
-            sumdata = np.reshape(rawdata, (dims[0],dims[1]/sublen,sublen)).sum(axis=2)
-            for j in range(np.shape(rawdata)[0]):
-                channel = rawdata[j]
-                sumchan = sumdata[j]
-                med = np.median(sumchan) # Median of channel
-                mad = np.median(np.abs(sumchan-med)) # Median absolute deviation (MAD) of channel 
-                offset = med - med_chi * (mad/mad_chi)
-                chidist = chi2(dof,scale = mad/mad_chi, loc=offset)
-                thresh = 1.2*chidist.ppf(1-(1E-15))
-                
-                for k in np.arange(0,len(channel),sublen): # Loop to slide window along freq channels
-                    window = np.copy(channel[k:k+sublen])
-                    for l in range(len(window)): # Loop to set values which have been previously flagged as zero to later calculate the mean of the window
-                        if Threshmask[j][k+l] == 1:
-                            window[l] = 0
-                    windowsum = np.sum(window)
-                    nonzeros = len(np.nonzero(window)[0]) # Counting number of non-zeros
-                    windowmean = windowsum/nonzeros
-                    for m in range(len(window)):
-                        if Threshmask[j][k+m] == 1:
-                            window[m] = windowmean
-                    windowthresh = np.sum(window)
-                    rawdata[j][k:k+sublen] = window # Setting the values in the data set to the values of the window
-                                                      
-                    if windowthresh > thresh: # If the average of the window is greater than the threshold, flag all values inside
-                        Threshmask[j][k:k+sublen] = 1 
+        if workers > 1:
+            SumThresholdParallel([(rawdata,Threshmask,1.2)],iterations,decfactor,mode,workers,processes)
+        else:
+            SumThresholdRows(rawdata,Threshmask,iterations,factor=1.2,decfactor=decfactor,mode=mode)
+        
+        if packed == True:
+            return PackedMask(Threshmask)
         
         return Threshmask
     
@@ -121,101 +91,385 @@ def SumThreshold(data,axis='both'):
         flipped = np.transpose(np.copy(rawdata))
         flippedmask = np.transpose(np.zeros_like(Threshmask))
         
-        ### First operation, going along time axis ### 
+        # Calulating the number of iterations based on the length of the input data (in exponential factors of 2)
+        if iterations is None:
+            iterations = 6 #If full number of iterations is desired, use: np.int(np.log(dims[1])/np.log(2))
         
-        #Dimensions of input array
-        dims1 = np.shape(rawdata) 
+        if workers > 1: # Both operations at once, with the channels of each split across the workers
+            SumThresholdParallel([(rawdata,Threshmask,1.2),(flipped,flippedmask,1.)],iterations,decfactor,mode,workers,processes)
+        else:
+            ### First operation, going along time axis ### 
+            SumThresholdRows(rawdata,Threshmask,iterations,factor=1.2,decfactor=decfactor,mode=mode)
+            
+            ### Second operation, going along the frequency axis ###
+            SumThresholdRows(flipped,flippedmask,iterations,decfactor=decfactor,mode=mode)
+
+        # Flipping the mask back to its original orientation
+        reflippedmask = np.transpose(flippedmask)
         
-        # Calulating the number of iterations based on the length of the input data (in exponential factors of 2)
-        iterations = 6 #If full number of iterations is desired, use: np.int(np.log(dims[1])/np.log(2))
+        if packed == True: # Combining the packed masks with a bitwise or
+            print 'Finished SumThreshold.'
+            return PackedMask(reflippedmask) | PackedMask(Threshmask)
         
-        for i in range(iterations+1): # Loop to iterate several times and to increase sub-sequence lengths ('sublen' variable)
-            sublen = 2**i
-            print 'Testing Sub-sequence length: ', sublen
-            dof = 2*128*sublen # Degrees of freedom, 256 per pixel (128 pixels summed into one, each with Re and Im components)
-            basechi = chi2(dof).rvs(size=1E5) # Calculating a base chi-squared distribution (not scaled or shifted)
-            med_chi = np.median(basechi) # Median of chi-sq distribution
-            mad_chi = np.median(np.abs(basechi - med_chi)) # MAD of chi-sq distribution
-            sumdata1 = np.reshape(rawdata, (dims1[0],dims1[1]/sublen,sublen)).sum(axis=2)
-            for j in range(np.shape(rawdata)[0]):
-                channel = rawdata[j]
-                sumchan = sumdata1[j]
-                med = np.median(sumchan) # Median of channel
-                mad = np.median(np.abs(sumchan-med)) # Median absolute deviation (MAD) of channel 
-                offset = med - med_chi * (mad/mad_chi)
-                chidist = chi2(dof,scale = mad/mad_chi, loc=offset)
-                thresh = 1.2*chidist.ppf(1-(1E-15))
-                
-                for k in np.arange(0,len(channel),sublen): # Loop to slide window along freq channels
-                    window = np.copy(channel[k:k+sublen])
-                    for l in range(len(window)): # Loop to set values which have been previously flagged as zero to later calculate the mean of the window
-                        if Threshmask[j][k+l] == 1:
-                            window[l] = 0
-                    windowsum = np.sum(window)
-                    nonzeros = len(np.nonzero(window)[0])
-                    windowmean = windowsum/nonzeros
-                    for m in range(len(window)):
-                        if Threshmask[j][k+m] == 1:
-                            window[m] = windowmean
-                    windowthresh = np.sum(window)
-                    rawdata[j][k:k+sublen] = window # Setting the values in the data set to the values of the window
-                                                      
-                    if windowthresh > thresh: # If the sum of the window is greater than the threshold, flag all values inside
-                        Threshmask[j][k:k+sublen] = 1
-                    
-        
-        ### Second operation, going along the frequency axis ###
-        
-        dims2 = np.shape(flipped) #Dimensions of input array
+        combinedmask = np.zeros(np.shape(data),dtype=policy['mask']) # Mask to combine both time-axis and freq-axis masks
+        print 'Combining the two masks...'
         
-        # Calulating the number of iterations based on the length of the input data (in exponential factors of 2)
-        iterations = 6 #If full number of iterations is desired, use: np.int(np.log(dims[1])/np.log(2))
+        # Combining both masks in a single array operation
+        combinedmask[(reflippedmask == 1) | (Threshmask == 1)] = 1
         
-        for i in range(iterations+1): # Loop to iterate several times and to increase sub-sequence lengths ('sublen' variable)
+        print 'Finished SumThreshold.' # For testing purposes
+        return combinedmask
+
+
+
+def SumThresholdRows(rawdata,mask,iterations,factor=1.,decfactor=128,mode='aligned',estimate=None):
+    """Runs the SumThreshold iterations along the rows of a data set, for all rows and windows at once
+    
+    For each sub-sequence length 2**i, the threshold of every row is calculated from a shifted and scaled Chi-squared 
+    distribution matched to the median and MAD of the row's window sums (see chi2table.chi2thresholds). In every 
+    (non-overlapping) window, previously flagged values are replaced by the mean of the unflagged non-zero values, and the
+    window is flagged if its sum then exceeds the threshold. rawdata (with replaced values) and mask are updated in place,
+    with the same flag/replace semantics as the per-window loops of the original implementation.
+    
+    With mode = 'sliding', every window position is tested instead. Cumulative sums of the unflagged values, of the 
+    number of unflagged non-zero values and of the number of flagged values give the sum of every window, with flagged
+    values counted at the window mean, in O(N) per row for any window length. Flags are spread over the windows with a 
+    second cumulative sum, and rawdata is left unchanged (flagged values are excluded through the mask instead).
+    
+    Keyword arguments:
+    rawdata -- Float array, data set whose rows are flagged independently (eg. channels, for flagging along the time axis)
+    mask -- Array, mask of the same shape as rawdata, flagged values are set to 1
+    iterations -- int, sub-sequence lengths 2**0 to 2**iterations are tested (in sliding mode, lengths longer than the 
+                  rows are skipped)
+    factor -- Factor by which the thresholds are multiplied (1.2 is used along the time axis) (default = 1)
+    decfactor -- Factor by which the data has been decimated, which sets the degrees of freedom of each pixel (default = 128)
+    mode -- 'aligned' for non-overlapping windows, or 'sliding' for windows at every position (default = 'aligned')
+    estimate -- (OPTIONAL) Function replacing the measured median and MAD of the window sums, see chi2table.chi2thresholds
+                (default = None)
+    """
+    # Importing required modules
+    import numpy as np
+    from chi2table import chi2thresholds
+    
+    dims = np.shape(rawdata) #Dimensions of input array
+    
+    if mode == 'sliding':
+        for i in range(iterations+1):
             sublen = 2**i
+            if sublen > dims[1]: # No window of this length fits in the rows
+                break
             print 'Testing Sub-sequence length: ', sublen
-            dof = 2*128*sublen # Degrees of freedom, 256 per pixel (128 pixels summed into one, each with Re and Im components)
-            basechi = chi2(dof).rvs(size=1E5) # Calculating a base chi-squared distribution (not scaled or shifted)
-            med_chi = np.median(basechi) # Median of chi-sq distribution
-            mad_chi = np.median(np.abs(basechi - med_chi)) # MAD of chi-sq distribution
-            sumdata2 = np.reshape(flipped, (dims2[0],dims2[1]/sublen,sublen)).sum(axis=2)
-            for j in range(dims2[0]):
-                col = flipped[j] 
-                sumcol = sumdata2[j]
-                med = np.median(sumcol) # Median of channel
-                mad = np.median(np.abs(sumcol-med)) # Median absolute deviation (MAD) of channel
-                offset = med - med_chi * (mad/mad_chi)
-                chidist = chi2(dof,scale = mad/mad_chi, loc=offset) #Recalculating a re-scaled and shifted chisq distribution
-                thresh = chidist.ppf(1-(1E-15))
-                 
-                for k in np.arange(0,len(col),sublen): # Loop to slide window along freq channels
-                    window = np.copy(col[k:k+sublen])
-                    for l in range(len(window)): # Loop to set values which have been previously flagged as zero to later calculate the mean of the window
-                        if flippedmask[j][k+l] == 1:
-                            window[l] = 0
-                    windowsum = np.sum(window)
-                    nonzeros = len(np.nonzero(window)[0])
-                    windowmean = windowsum/nonzeros
-                    for m in range(len(window)):
-                        if flippedmask[j][k+m] == 1:
-                            window[m] = windowmean
-                    windowthresh = np.sum(window)
-                    flipped[j][k:k+sublen] = window # Setting the values in the data set to the values of the window
-
-                    if windowthresh > thresh: # If the average of the window is greater than the threshold, flag all values inside
-                        flippedmask[j][k:k+sublen] = 1
+            slidingRows(rawdata,mask,sublen,factor,decfactor,estimate)
+        return
+    elif mode != 'aligned':
+        raise ValueError("Mode must be 'aligned' or 'sliding'")
+    
+    for i in range(iterations+1): # Loop to iterate several times and to increase sub-sequence lengths ('sublen' variable)
+        sublen = 2**i
+        print 'Testing Sub-sequence length: ', sublen
+        dof = 2*decfactor*sublen # Degrees of freedom, 2*decfactor per pixel (decfactor pixels summed into one, each with Re and Im components)
+        
+        # Thresholds of every row, from the median and MAD of its window sums and the tabulated chi-sq statistics
+        sumdata = np.reshape(rawdata, (dims[0],dims[1]/sublen,sublen)).sum(axis=2)
+        thresh = chi2thresholds(sumdata,dof,factor,estimate=estimate)
+        
+        # Setting previously flagged values to zero, to calculate the mean of the non-zero values of each window
+        flagged = np.reshape(mask, (dims[0],dims[1]/sublen,sublen)) == 1
+        window = np.where(flagged,0,np.reshape(rawdata, (dims[0],dims[1]/sublen,sublen)))
+        windowsum = window.sum(axis=2)
+        nonzeros = np.count_nonzero(window,axis=2) # Counting the number of non-zero values
+        with np.errstate(divide='ignore',invalid='ignore'):
+            windowmean = windowsum/nonzeros
+        
+        # Replacing the flagged values by the window means, and setting the values in the data set to those of the windows
+        window = np.where(flagged,windowmean[:,:,np.newaxis],window)
+        windowthresh = window.sum(axis=2)
+        rawdata[...] = np.reshape(window, dims)
+        
+        # If the sum of the window is greater than the threshold, flag all values inside
+        with np.errstate(invalid='ignore'):
+            newflags = windowthresh > thresh[:,np.newaxis]
+        flagged[newflags] = True
+        mask[flagged.reshape(dims)] = 1
 
-        # Flipping the mask back to its original orientation
-        reflippedmask = np.transpose(flippedmask)
+
+
+
+# Shared-memory arrays of the current SumThresholdParallel call, set in each worker process by _sharedInit
+_shared = []
+
+
+
+def _sharedInit(shared):
+    """Stores the shared-memory arrays in a worker process (they are inherited when the pool starts)"""
+    _shared[:] = shared
+
+
+
+def _sharedRows(task):
+    """Runs SumThresholdRows on the rows start:stop of one of the shared-memory (rawdata, mask) pairs"""
+    # Importing required modules
+    import numpy as np
+    
+    job, start, stop, iterations, factor, decfactor, mode = task
+    databuf, maskbuf, shape, dtype, masktype = _shared[job]
+    rawdata = np.frombuffer(databuf, dtype=dtype).reshape(shape)
+    mask = np.frombuffer(maskbuf, dtype=masktype).reshape(shape)
+    SumThresholdRows(rawdata[start:stop],mask[start:stop],iterations,factor,decfactor,mode)
+
+
+
+def SumThresholdParallel(jobs,iterations,decfactor=128,mode='aligned',workers=2,processes=False):
+    """Runs SumThresholdRows on several data sets at once, with the rows of every data set split across a pool of workers
+    
+    Rows are flagged independently (each has its own thresholds), so every data set is cut into 'workers' blocks of 
+    contiguous rows and all blocks of all data sets are processed concurrently. With threads, the workers operate on 
+    views of the arrays (numpy releases the GIL in the sums, sorts and comparisons). With processes, the arrays are 
+    copied once into shared memory (multiprocessing.RawArray) inherited by the workers, and the results copied back. 
+    The Chi-squared reference statistics are computed beforehand, so workers only read the table.
+    
+    Keyword arguments:
+    jobs -- List of (rawdata, mask, factor) tuples, the arguments of SumThresholdRows for each data set; rawdata and mask
+            are updated in place
+    iterations -- int, sub-sequence lengths 2**0 to 2**iterations are tested
+    decfactor -- Factor by which the data has been decimated (default = 128)
+    mode -- 'aligned' or 'sliding', see SumThresholdRows (default = 'aligned')
+    workers -- int, number of threads or processes (default = 2)
+    processes -- boolean, if True, uses a process pool over shared memory instead of a thread pool (default = False)
+    """
+    # Importing required modules
+    import ctypes
+    import numpy as np
+    from multiprocessing import RawArray
+    from multiprocessing.pool import Pool, ThreadPool
+    from chi2table import chi2table
+    
+    if workers < 1:
+        raise ValueError('Number of workers must be at least 1')
+    
+    chi2table(decfactor, iterations) # Filling the in-memory table before the workers start
+    
+    # Blocks of contiguous rows of every data set
+    tasks = []
+    for job, (rawdata, mask, factor) in enumerate(jobs):
+        bounds = np.linspace(0, len(rawdata), min(workers, len(rawdata))+1).astype(int)
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            tasks.append((job, int(start), int(stop), iterations, factor, decfactor, mode))
+    
+    if processes == True:
+        # Copying the arrays into shared memory, inherited by the worker processes
+        shared = []
+        for rawdata, mask, factor in jobs:
+            databuf = RawArray(ctypes.c_byte, rawdata.nbytes)
+            maskbuf = RawArray(ctypes.c_byte, mask.nbytes)
+            np.frombuffer(databuf, dtype=rawdata.dtype).reshape(rawdata.shape)[...] = rawdata
+            np.frombuffer(maskbuf, dtype=mask.dtype).reshape(mask.shape)[...] = mask
+            shared.append((databuf, maskbuf, rawdata.shape, rawdata.dtype, mask.dtype))
         
-        combinedmask = np.zeros_like(data) # Mask to combine both time-axis and freq-axis masks
-        print 'Combining the two masks...'
+        pool = Pool(workers, _sharedInit, (shared,))
+        try:
+            pool.map(_sharedRows, tasks, chunksize=1)
+        finally:
+            pool.terminate()
         
-        # Loop to iterate through both masks and create a combined mask
-        for n in range(np.shape(reflippedmask)[0]): 
-            for m in range(np.shape(reflippedmask)[1]):
-                if reflippedmask[n][m] == 1 or Threshmask[n][m] == 1:
-                    combinedmask[n][m] = 1
+        # Copying the results back
+        for (rawdata, mask, factor), (databuf, maskbuf, shape, dtype, masktype) in zip(jobs, shared):
+            rawdata[...] = np.frombuffer(databuf, dtype=dtype).reshape(shape)
+            mask[...] = np.frombuffer(maskbuf, dtype=masktype).reshape(shape)
+    else:
+        def rows(task):
+            job, start, stop, iterations, factor, decfactor, mode = task
+            SumThresholdRows(jobs[job][0][start:stop],jobs[job][1][start:stop],iterations,factor,decfactor,mode)
         
-        print 'Finished SumThreshold.' # For testing purposes
-        return combinedmask
\ No newline at end of file
+        pool = ThreadPool(workers)
+        try:
+            pool.map(rows, tasks, chunksize=1)
+        finally:
+            pool.terminate()
+
+
+
+
+def slidingRows(rawdata,mask,sublen,factor=1.,decfactor=128,estimate=None):
+    """Runs one sliding-window SumThreshold iteration of window length sublen along the rows of a data set, updating mask
+    
+    Keyword arguments:
+    rawdata -- Float array, data set whose rows are flagged independently
+    mask -- Array, mask of the same shape as rawdata, flagged values are set to 1
+    sublen -- int, length of the windows
+    factor -- Factor by which the thresholds are multiplied (default = 1)
+    decfactor -- Factor by which the data has been decimated, which sets the degrees of freedom of each pixel (default = 128)
+    estimate -- (OPTIONAL) Function replacing the measured median and MAD of the window sums, see chi2table.chi2thresholds
+                (default = None)
+    """
+    # Importing required modules
+    import numpy as np
+    from chi2table import chi2thresholds
+    
+    dims = np.shape(rawdata)
+    if sublen > dims[1]:
+        raise ValueError('Sub-sequence length is longer than the rows')
+    
+    # Cumulative sums of unflagged values, unflagged non-zero values and flagged values along each row
+    flagged = mask == 1
+    values = np.where(flagged,0,rawdata)
+    zero = np.zeros((dims[0],1))
+    csum = np.concatenate((zero,np.cumsum(values,axis=1)),axis=1)
+    cnonzero = np.concatenate((zero,np.cumsum(values != 0,axis=1)),axis=1)
+    cflagged = np.concatenate((zero,np.cumsum(flagged,axis=1)),axis=1)
+    
+    # Sum of the window starting at every position, with its flagged values replaced by the mean of the window
+    windowsum = csum[:,sublen:] - csum[:,:-sublen]
+    nonzeros = cnonzero[:,sublen:] - cnonzero[:,:-sublen]
+    nflagged = cflagged[:,sublen:] - cflagged[:,:-sublen]
+    with np.errstate(divide='ignore',invalid='ignore'):
+        windowthresh = windowsum + nflagged*windowsum/nonzeros
+    
+    # Thresholds from the non-overlapping windows, ignoring windows with no unflagged values
+    dof = 2*decfactor*sublen
+    thresh = chi2thresholds(windowthresh[:,::sublen],dof,factor,ignorenan=True,estimate=estimate)
+    with np.errstate(invalid='ignore'):
+        newflags = windowthresh > thresh[:,np.newaxis]
+    
+    # Flagging every value covered by at least one flagged window: value t is covered by the windows starting in 
+    # [t-sublen+1, t], counted from the cumulative sum of flagged window starts
+    cstarts = np.concatenate((zero,np.cumsum(newflags,axis=1)),axis=1)
+    t = np.arange(dims[1])
+    hi = np.minimum(t, dims[1]-sublen) + 1
+    lo = np.maximum(t-sublen+1, 0)
+    covered = (cstarts[:,hi] - cstarts[:,lo]) > 0
+    mask[covered] = 1
+
+
+
+
+class SumThresholdStream(object):
+    """Streaming SumThreshold flagger which consumes blocks of decimated power and emits finalized mask blocks
+    
+    Each block is flagged together with the last 2**iterations samples of the previous data (the longest window), so 
+    every window overlapping a new sample is tested exactly as in a contiguous array, and those carried samples are only
+    emitted once no later window can reach them. The median and MAD of each channel's window sums are kept as running 
+    estimates (exponentially weighted, with weight alpha for each new block) instead of being measured over the whole
+    observation, so memory and latency are bounded by the block size. Flagging along the frequency axis needs no carried
+    statistics, as every spectrum is complete within a block.
+    
+    Keyword arguments:
+    axis -- Which axis to perform the flagging along, 0, 1 or 'both', as in SumThreshold (default = 1)
+    decfactor -- Factor by which the input data has been decimated (default = 128)
+    iterations -- int, sub-sequence lengths 2**0 to 2**iterations are tested (default = 7)
+    mode -- 'sliding' or 'aligned', see SumThresholdRows; with 'aligned', block lengths must be multiples of 2**iterations
+            (default = 'sliding')
+    alpha -- Float, weight of each new block in the running median and MAD estimates, 1 uses each block's own (default = 0.25)
+    precision -- (OPTIONAL) Precision policy of the working data and masks, 'double', 'single' or 'integer', see 
+                 precision.precision (default = 'double')
+    packed -- (OPTIONAL) boolean, if True, update and flush return the masks as packed bits (see RFImask.PackedMask) 
+              (default = False)
+    """
+    def __init__(self,axis=1,decfactor=128,iterations=7,mode='sliding',alpha=0.25,precision='double',packed=False):
+        from precision import precision as dtypes
+        
+        if axis not in (0,1,'both'):
+            raise ValueError("Axis must be 0, 1 or 'both'")
+        elif mode not in ('aligned','sliding'):
+            raise ValueError("Mode must be 'aligned' or 'sliding'")
+        elif not 0 < alpha <= 1:
+            raise ValueError('Alpha must be in (0, 1]')
+        
+        self.axis = axis
+        self.decfactor = decfactor
+        self.iterations = iterations
+        self.mode = mode
+        self.alpha = alpha
+        self.policy = dtypes(precision)
+        self.packed = packed
+        
+        # Number of samples held back, none when only flagging spectra along the frequency axis
+        self.overlap = 0 if axis == 0 else 2**iterations
+        
+        self.reset()
+    
+    def reset(self):
+        """Discards the carried samples and the running statistics"""
+        self.data = None # Carried samples of shape (frequency, time), not yet emitted
+        self.timemask = None # Time-axis flags of the carried samples
+        self.freqmask = None # Frequency-axis flags of the carried samples
+        self.stats = {} # Running (median, MAD) of every channel, keyed by degrees of freedom
+        self.emitted = 0 # Number of samples emitted so far
+    
+    def estimate(self,dof,med,mad):
+        """Blends the median and MAD measured in the current block into the running estimates, and returns them"""
+        import numpy as np
+        
+        if dof not in self.stats:
+            self.stats[dof] = (med,mad)
+            return med,mad
+        
+        oldmed,oldmad = self.stats[dof]
+        # Channels without a measurement (eg. fully flagged) keep their estimates, and new channels take the measurement
+        newmed = np.where(np.isnan(med),oldmed,np.where(np.isnan(oldmed),med,(1-self.alpha)*oldmed + self.alpha*med))
+        newmad = np.where(np.isnan(mad),oldmad,np.where(np.isnan(oldmad),mad,(1-self.alpha)*oldmad + self.alpha*mad))
+        self.stats[dof] = (newmed,newmad)
+        return newmed,newmad
+    
+    def update(self,block):
+        """Flags a block of decimated power of shape (frequency, time), and returns the finalized mask of shape 
+        (frequency, samples); the last 2**iterations samples are held back until the next block (see flush)
+        """
+        import numpy as np
+        
+        block = np.array(block,dtype=self.policy['float'])
+        dims = np.shape(block)
+        if self.mode == 'aligned' and dims[1] % 2**self.iterations != 0:
+            raise ValueError('Block length must be a multiple of the longest sub-sequence length in aligned mode')
+        
+        if self.data is None:
+            self.data = np.zeros((dims[0],0),dtype=self.policy['float'])
+            self.timemask = np.zeros((dims[0],0),dtype=self.policy['mask'])
+            self.freqmask = np.zeros((dims[0],0),dtype=self.policy['mask'])
+        
+        # Carried samples followed by the new block
+        rawdata = np.concatenate((self.data,block),axis=1)
+        timemask = np.concatenate((self.timemask,np.zeros(dims,dtype=self.policy['mask'])),axis=1)
+        freqmask = np.concatenate((self.freqmask,np.zeros(dims,dtype=self.policy['mask'])),axis=1)
+        
+        if self.axis in (1,'both'): # Along the time axis, with the carried flags and running statistics
+            SumThresholdRows(np.copy(rawdata),timemask,self.iterations,factor=1.2,decfactor=self.decfactor,mode=self.mode,estimate=self.estimate)
+        
+        if self.axis in (0,'both'): # Along the frequency axis, for the spectra of the new block only
+            flipped = np.transpose(np.copy(block))
+            flippedmask = np.zeros_like(flipped,dtype=self.policy['mask'])
+            SumThresholdRows(flipped,flippedmask,self.iterations,decfactor=self.decfactor,mode=self.mode)
+            freqmask[:,-dims[1]:] = np.transpose(flippedmask)
+        
+        # Holding back the samples which windows of the next block can still reach
+        cut = max(np.shape(rawdata)[1] - self.overlap,0)
+        self.data = rawdata[:,cut:]
+        self.timemask = timemask[:,cut:]
+        self.freqmask = freqmask[:,cut:]
+        self.emitted += cut
+        
+        combinedmask = np.zeros((dims[0],cut),dtype=self.policy['mask'])
+        combinedmask[(timemask[:,:cut] == 1) | (freqmask[:,:cut] == 1)] = 1
+        if self.packed == True:
+            from RFImask import PackedMask
+            return PackedMask(combinedmask)
+        return combinedmask
+    
+    def flush(self):
+        """Returns the mask of the samples held back at the end of the observation, and discards them"""
+        import numpy as np
+        
+        if self.data is None:
+            return None
+        
+        combinedmask = np.zeros(np.shape(self.data),dtype=self.policy['mask'])
+        combinedmask[(self.timemask == 1) | (self.freqmask == 1)] = 1
+        self.emitted += np.shape(self.data)[1]
+        
+        self.data = self.data[:,:0]
+        self.timemask = self.timemask[:,:0]
+        self.freqmask = self.freqmask[:,:0]
+        if self.packed == True:
+            from RFImask import PackedMask
+            return PackedMask(combinedmask)
+        return combinedmask
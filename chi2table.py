@@ -0,0 +1,91 @@
+def chi2stats(dof, tail=1E-15, cachefile=None):
+    """Returns the median, median absolute deviation (MAD) and upper tail quantile of a Chi-squared distribution
+    
+    These are the reference statistics SumThreshold matches to the median and MAD of each channel. They are computed 
+    to full precision (the median and tail quantile from the inverse distribution, the MAD by solving 
+    F(median + MAD) - F(median - MAD) = 0.5) instead of being estimated from random draws, so thresholds are exactly 
+    reproducible. Results are memoized in memory and in a small JSON table on disk.
+    
+    Keyword arguments:
+    dof -- int, degrees of freedom of the distribution (2*decfactor*sublen for SumThreshold)
+    tail -- Float, probability above the tail quantile (default = 1E-15)
+    cachefile -- String, path of the on-disk table, None uses ~/.aro_rfi/chi2table.json (default = None)
+    
+    Returns a dictionary with keys 'median', 'mad' and 'quantile'.
+    """
+    # Importing required modules
+    from scipy.stats import chi2
+    from scipy.optimize import brentq
+    from tablecache import cachePath, cacheLookup, cacheStore
+    
+    if cachefile is None:
+        cachefile = cachePath('chi2table.json')
+    
+    key = '%d,%r'%(dof, float(tail))
+    cached = cacheLookup(cachefile, key)
+    if cached is not None:
+        return cached
+    
+    med_chi = float(chi2.ppf(0.5, dof)) # Median of chi-sq distribution
+    
+    # MAD of chi-sq distribution, the half-width of the interval around the median which holds half of the probability
+    halfprob = lambda x: chi2.cdf(med_chi + x, dof) - chi2.cdf(med_chi - x, dof) - 0.5
+    mad_chi = float(brentq(halfprob, 0, med_chi, xtol=1E-12*med_chi))
+    
+    stats = {'median': med_chi, 'mad': mad_chi, 'quantile': float(chi2.isf(tail, dof))}
+    
+    # Storing in memory and in the on-disk table
+    cacheStore(cachefile, key, stats, name='Chi-squared table')
+    
+    return stats
+
+
+
+def chi2table(decfactor=128, iterations=7, tail=1E-15):
+    """Precomputes (and caches) the Chi-squared reference statistics for every sub-sequence length used by SumThreshold
+    
+    Keyword arguments:
+    decfactor -- Factor by which the data has been decimated (default = 128)
+    iterations -- int, sub-sequence lengths 2**0 to 2**iterations are included (default = 7)
+    tail -- Float, probability above the tail quantile (default = 1E-15)
+    
+    Returns a dictionary of chi2stats results keyed by degrees of freedom (2*decfactor*2**i).
+    """
+    return dict((2*decfactor*2**i, chi2stats(2*decfactor*2**i, tail)) for i in range(iterations+1))
+
+
+
+def chi2thresholds(sumdata, dof, factor=1., tail=1E-15, ignorenan=False, estimate=None):
+    """Returns the SumThreshold threshold of every row of an array of window sums in one vectorized call
+    
+    The reference Chi-squared distribution is scaled by MAD/MAD_chi and shifted so its median matches the median of each 
+    row, and the threshold is its upper tail quantile. Rows with a MAD of zero get a threshold of NaN (never flagged).
+    
+    Keyword arguments:
+    sumdata -- Array, window sums of shape (rows, windows), eg. channels along the time axis
+    dof -- int, degrees of freedom of each window sum (2*decfactor*sublen)
+    factor -- Factor by which the thresholds are multiplied (1.2 is used along the time axis) (default = 1)
+    tail -- Float, probability above the threshold of the reference distribution (default = 1E-15)
+    ignorenan -- boolean, if True, NaN window sums (eg. fully flagged windows) are left out of the median and MAD (default = False)
+    estimate -- (OPTIONAL) Function estimate(dof, med, mad) returning the median and MAD of each row to use instead of 
+                those measured, eg. running estimates carried across blocks by SumThresholdStream (default = None)
+    """
+    # Importing required modules
+    import numpy as np
+    
+    stats = chi2stats(dof, tail)
+    median = np.nanmedian if ignorenan == True else np.median
+    
+    with np.errstate(invalid='ignore'):
+        med = median(sumdata,axis=1) # Median of each row
+        mad = median(np.abs(sumdata-med[:,np.newaxis]),axis=1) # Median absolute deviation (MAD) of each row
+    if estimate is not None:
+        med, mad = estimate(dof, med, mad)
+    scale = mad/stats['mad']
+    offset = med - stats['median']*scale
+    
+    thresh = factor*(offset + scale*stats['quantile'])
+    with np.errstate(invalid='ignore'):
+        thresh[~(scale > 0)] = np.nan # Degenerate rows, where the scaled distribution is undefined
+    
+    return thresh
@@ -1,10 +1,16 @@
-def dataIO(filenum,time=False, filepath='/mnt/scratch-lustre/simard/B0329_080416/20160805T202001Z_aro_raw/*vdif'):
+def dataIO(filenum,time=False, filepath='/mnt/scratch-lustre/simard/B0329_080416/20160805T202001Z_aro_raw/*vdif', index=None, mmap=False, out=None, scale=True):
     """Loads in data based on given file number and returns a numpy array of the raw voltages
     
     Keyword arguments:
     filenum -- int , the file-number of the data sets you want to load
     time -- boolean, if True, it will return the time of observation
     filepath -- String, full filepath to the data set (defaults to filepath for b0329+54 data set)
+    index -- (OPTIONAL) Dictionary, index of the observation as returned by dataIndex, if given the file list and start time 
+             are taken from the index instead of globbing the directory and parsing the header (default = None)
+    mmap -- (OPTIONAL) boolean, if True, the file is memory-mapped and decoded with vdifRead instead of baseband (default = False)
+    out -- (OPTIONAL) Complex array, preallocated array of shape (2**16, 1024, 2) to decode into when mmap is True (default = None)
+    scale -- (OPTIONAL) boolean, if False, the integer levels are kept instead of being scaled as in baseband, eg. for the 
+             'integer' precision policy, only with mmap = True (default = True)
     
     """
     print 'Loading in Data Set...'
@@ -16,22 +22,43 @@ def dataIO(filenum,time=False, filepath='/mnt/scratch-lustre/simard/B0329_080416
     from astropy.time import Time
     import glob
     
+    if scale != True and mmap != True:
+        raise ValueError('Unscaled voltages can only be decoded from memory-mapped files (mmap = True)')
+    
     # Defining variables (default values for ARO data)
     nfreqs = 1024 # Number of frequency channels 
     sample_rate = 800/(2.*nfreqs) * u.MHz
     size = 2**16
     
     # Loading in the data
-    filelist = np.sort(glob.glob(filepath))
-    fn = filelist[filenum]
-    fh = vdif.open(fn, mode='rs', sample_rate=sample_rate)
-    d = fh.read(size)
+    if index is not None:
+        fn = index['files'][filenum]['path']
+    else:
+        filelist = np.sort(glob.glob(filepath))
+        fn = filelist[filenum]
+    
+    if mmap == True:
+        # Decoding straight from the mapped file into the (time, frequency, polarization) layout
+        vmap = vdifMap(fn, sample_rate=sample_rate.value)
+        d = vdifRead(vmap, 0, size, out=out, scale=scale)
+    else:
+        fh = vdif.open(fn, mode='rs', sample_rate=sample_rate)
+        d = fh.read(size)
+        
+        #Rearranging the dimensions of the array
+        d = np.einsum('ijk->ikj',d)
     
-    #Rearranging the dimensions of the array
-    d = np.einsum('ijk->ikj',d)
+    # Start time information is stored in the index, or in the mapped header
+    if time == True and (index is not None or mmap == True):
+        if index is not None:
+            timestr = index['files'][filenum]['start']
+        else:
+            timestr = vmap['start']
+        print 'Finished loading in Data Set.'
+        return d, timestr
     
     #Loop to manually parse the header and extract the start time information
-    if time == True:
+    elif time == True:
         head = str(fh)
         timeindex = head.find('time=') + 5
         datestr = []
@@ -45,4 +72,541 @@ def dataIO(filenum,time=False, filepath='/mnt/scratch-lustre/simard/B0329_080416
     
     else:
         print 'Finished loading in Data Set.'
-        return d
\ No newline at end of file
+        return d
+
+
+def dataStream(blocksize=2**16, overlap=0, time=False, start=0, stop=None, filepath='/mnt/scratch-lustre/simard/B0329_080416/20160805T202001Z_aro_raw/*vdif', index=None):
+    """Generator which yields contiguous blocks of raw voltages spanning the boundaries between VDIF files
+    
+    The sorted file list is globbed once, and each file is opened only once and read sequentially, so an entire
+    observation can be processed block by block at constant memory. Each yielded block has the same layout as the
+    output of dataIO, ie. (time, 1024, 2). The final partial block at the end of the file list is dropped.
+    
+    Keyword arguments:
+    blocksize -- int, number of time samples in each yielded block (default = 2**16)
+    overlap -- int, number of time samples shared between consecutive blocks, must be less than blocksize (default = 0)
+    time -- boolean, if True, yields tuples of (block, timestr) where timestr is the start time of the block
+    start -- int, file-number of the first file to read (default = 0)
+    stop -- int, file-number after the last file to read, None reads to the end of the file list (default = None)
+    filepath -- String, full filepath to the data set (defaults to filepath for b0329+54 data set)
+    index -- (OPTIONAL) Dictionary, index of the observation as returned by dataIndex, used instead of globbing (default = None)
+    
+    """
+    # Importing required modules 
+    import numpy as np
+    from baseband import vdif
+    import astropy.units as u
+    import glob
+    
+    # Conditions checking that the block parameters are sensible
+    if blocksize <= 0:
+        raise ValueError('Block size must be positive')
+    elif overlap < 0 or overlap >= blocksize:
+        raise ValueError('Overlap must be non-negative and less than the block size')
+    
+    # Defining variables (default values for ARO data)
+    nfreqs = 1024 # Number of frequency channels 
+    sample_rate = 800/(2.*nfreqs) * u.MHz
+    
+    # Globbing the file list only once for the whole observation
+    if index is not None:
+        filelist = [entry['path'] for entry in index['files']][start:stop]
+    else:
+        filelist = np.sort(glob.glob(filepath))[start:stop]
+    
+    block = None # Block currently being filled
+    filled = 0 # Number of samples already in the current block
+    tblock = None # Start time of the current block
+    
+    for fn in filelist:
+        fh = vdif.open(fn, mode='rs', sample_rate=sample_rate)
+        remaining = fh.shape[0] - fh.tell()
+        
+        while remaining > 0:
+            if block is None: # Allocating the first block once the sample shape is known
+                block = np.empty((blocksize,) + fh.sample_shape[::-1], dtype=fh.dtype)
+            
+            if time == True and tblock is None: # Start time of the block, accounting for the overlapping samples
+                tblock = fh.tell(unit='time') - (filled/sample_rate).to(u.s)
+            
+            # Reading as many samples as fit into the current block, and rearranging the dimensions of the array
+            nread = min(blocksize - filled, remaining)
+            d = fh.read(nread)
+            block[filled:filled+nread] = np.einsum('ijk->ikj',d)
+            filled += nread
+            remaining -= nread
+            
+            if filled == blocksize:
+                # Yielding the block, then starting the next one with the overlapping tail of this one
+                out = block
+                block = np.empty_like(out)
+                block[:overlap] = out[blocksize-overlap:]
+                filled = overlap
+                
+                if time == True:
+                    yield out, tblock.isot
+                else:
+                    yield out
+                
+                tblock = None
+        
+        fh.close()
+
+
+
+def dataIndex(filepath='/mnt/scratch-lustre/simard/B0329_080416/20160805T202001Z_aro_raw/*vdif', indexfile=None, update=True):
+    """Returns a persistent index of the VDIF files in an observation, building or updating it on disk as needed
+    
+    The index holds, for every file: the path, start time, number of frames per thread, samples per frame, 
+    sample rate, number of threads and the sample offset of the file from the start of the observation. Only files 
+    which are new or have changed on disk (size or modification time) are re-opened, so repeated calls on a large 
+    directory only cost a single directory listing. 
+    
+    Keyword arguments:
+    filepath -- String, full filepath to the data set (defaults to filepath for b0329+54 data set)
+    indexfile -- String, path of the index file, None places 'vdifindex.json' in the data directory, or in the working
+                 directory if the data directory is not writable (default = None)
+    update -- boolean, if False, an existing index file is loaded as is without checking the directory (default = True)
+    
+    """
+    # Importing required modules
+    import numpy as np
+    from baseband import vdif
+    import astropy.units as u
+    from astropy.time import Time
+    import glob
+    import json
+    import os
+    
+    # Defining variables (default values for ARO data)
+    nfreqs = 1024 # Number of frequency channels 
+    sample_rate = 800/(2.*nfreqs) * u.MHz
+    
+    # Choosing where the index is kept
+    if indexfile is None:
+        datadir = os.path.dirname(os.path.abspath(filepath))
+        if os.access(datadir, os.W_OK):
+            indexfile = os.path.join(datadir, 'vdifindex.json')
+        else:
+            indexfile = os.path.join(os.getcwd(), 'vdifindex_%s.json'%os.path.basename(datadir))
+    
+    # Loading the existing index, if it was built for the same set of files
+    index = {'filepath': filepath, 'files': []}
+    if os.path.exists(indexfile):
+        with open(indexfile) as f:
+            stored = json.load(f)
+        if stored['filepath'] == filepath:
+            index = stored
+            if update == False:
+                return index
+    
+    # Re-using entries for files which have not changed, and opening only the new or modified files
+    known = dict((entry['path'], entry) for entry in index['files'])
+    entries = []
+    changed = False
+    for fn in np.sort(glob.glob(filepath)):
+        stat = os.stat(fn)
+        entry = known.pop(fn, None)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            fh = vdif.open(fn, mode='rs', sample_rate=sample_rate)
+            entry = {'path': str(fn),
+                     'start': fh.start_time.isot,
+                     'frames': int(fh.shape[0]//fh.samples_per_frame),
+                     'samples_per_frame': int(fh.samples_per_frame),
+                     'sample_rate': float(fh.sample_rate.to(u.Hz).value),
+                     'threads': int(fh.sample_shape[0]),
+                     'size': stat.st_size,
+                     'mtime': stat.st_mtime}
+            fh.close()
+            changed = True
+        entries.append(entry)
+    
+    if changed == True or len(known) > 0: # Re-computing sample offsets and saving only if something changed
+        if len(entries) > 0:
+            tstart = Time(entries[0]['start'], precision=9, format='isot')
+            for entry in entries:
+                dt = (Time(entry['start'], precision=9, format='isot') - tstart).to(u.s).value
+                entry['offset'] = int(np.round(dt*entry['sample_rate']))
+        
+        index = {'filepath': filepath, 'files': entries}
+        with open(indexfile, 'w') as f:
+            json.dump(index, f)
+    
+    return index
+
+
+
+def dataLocate(index, t=None, sample=None):
+    """Maps an absolute time or a sample offset in an observation to a file and frame position using a dataIndex index
+    
+    Returns a dictionary with the file-number ('filenum'), the path ('path'), the frame within the file ('frame'), the 
+    sample within the file ('sample') and the sample offset from the start of the observation ('offset').
+    
+    Keyword arguments:
+    index -- Dictionary, index of the observation as returned by dataIndex
+    t -- String or astropy Time, absolute time to look up (isot format if given as a string)
+    sample -- int, sample offset from the start of the first file in the index (used if t is not given)
+    
+    """
+    # Importing required modules
+    import numpy as np
+    import astropy.units as u
+    from astropy.time import Time
+    
+    files = index['files']
+    if len(files) == 0:
+        raise ValueError('Index does not contain any files')
+    
+    # Converting an absolute time into a sample offset from the start of the observation
+    if t is not None:
+        tstart = Time(files[0]['start'], precision=9, format='isot')
+        dt = (Time(t, precision=9, format='isot') - tstart).to(u.s).value
+        sample = int(np.floor(dt*files[0]['sample_rate'] + 0.5))
+    elif sample is None:
+        raise ValueError('Either a time or a sample offset must be given')
+    
+    # Binary search of the file containing the requested sample
+    offsets = np.array([entry['offset'] for entry in files])
+    filenum = int(np.searchsorted(offsets, sample, side='right')) - 1
+    if filenum < 0:
+        raise ValueError('Requested position is before the start of the observation')
+    
+    entry = files[filenum]
+    local = sample - entry['offset']
+    if local >= entry['frames']*entry['samples_per_frame']:
+        raise ValueError('Requested position is not covered by any file (gap or end of observation)')
+    
+    return {'filenum': filenum, 'path': entry['path'], 'frame': local//entry['samples_per_frame'], 'sample': local, 'offset': sample}
+
+
+
+def dataBlock(index, start, size=2**16, out=None, mmap=False, scale=True):
+    """Loads a contiguous block of raw voltages starting at any sample of an observation, using a dataIndex index
+    
+    The block may span several files, and is returned with the same layout as the output of dataIO, ie. (time, 1024, 2).
+    
+    Keyword arguments:
+    index -- Dictionary, index of the observation as returned by dataIndex
+    start -- int, sample offset of the start of the block from the start of the observation
+    size -- int, number of time samples in the block (default = 2**16)
+    out -- (OPTIONAL) Array, preallocated output array of shape (size, 1024, 2) to load the block into (default = None)
+    mmap -- (OPTIONAL) boolean, if True, files are memory-mapped and decoded with vdifRead instead of baseband (default = False)
+    scale -- (OPTIONAL) boolean, if False, the integer levels are kept instead of being scaled as in baseband, eg. for the 
+             'integer' precision policy, only with mmap = True (default = True)
+    
+    """
+    # Importing required modules
+    import numpy as np
+    from baseband import vdif
+    import astropy.units as u
+    
+    if scale != True and mmap != True:
+        raise ValueError('Unscaled voltages can only be decoded from memory-mapped files (mmap = True)')
+    
+    filled = 0
+    while filled < size:
+        # Finding the file and position of the next sample to be read
+        loc = dataLocate(index, sample=start+filled)
+        entry = index['files'][loc['filenum']]
+        nread = min(size - filled, entry['frames']*entry['samples_per_frame'] - loc['sample'])
+        
+        if mmap == True:
+            # Decoding straight from the mapped file into the output array
+            vmap = _cachedMap(entry['path'], sample_rate=entry['sample_rate']/1E6) # Headers are parsed once per file
+            if out is None:
+                out = np.empty((size, vmap['nchan'], len(vmap['threads'])), dtype=np.complex64)
+            vdifRead(vmap, loc['sample'], nread, out=out[filled:filled+nread], scale=scale)
+        else:
+            fh = vdif.open(entry['path'], mode='rs', sample_rate=entry['sample_rate']*u.Hz)
+            fh.seek(loc['sample'])
+            
+            if out is None:
+                out = np.empty((size,) + fh.sample_shape[::-1], dtype=fh.dtype)
+            
+            # Reading as much of the block as this file contains, and rearranging the dimensions of the array
+            out[filled:filled+nread] = np.einsum('ijk->ikj',fh.read(nread))
+            fh.close()
+        
+        filled += nread
+    
+    return out
+
+
+
+class Prefetcher(object):
+    """Iterator which loads and decodes the next blocks of an observation in the background while the current one is used
+    
+    Blocks are read with dataBlock by a pool of worker threads (or processes), and at most 'depth' blocks are decoded
+    ahead of the block currently being processed. The blocks are yielded in order with the same layout as dataStream.
+    Calling stats() reports how many blocks were ready when requested (queue depth) and how long the consumer had to 
+    wait for blocks (stall time), for sizing the depth and number of workers for a given disk.
+    
+    Keyword arguments:
+    index -- Dictionary, index of the observation as returned by dataIndex
+    blocksize -- int, number of time samples in each block (default = 2**16)
+    overlap -- int, number of time samples shared between consecutive blocks (default = 0)
+    depth -- int, maximum number of blocks decoded ahead of the consumer (default = 4)
+    workers -- int, number of threads or processes decoding blocks in parallel (default = 2)
+    start -- int, sample offset of the first block from the start of the observation (default = 0)
+    stop -- int, sample offset at which to stop, None runs to the end of the last file in the index (default = None)
+    processes -- boolean, if True, decodes with a process pool instead of a thread pool (default = False)
+    mmap -- boolean, if True, blocks are decoded from memory-mapped files with vdifRead (default = False)
+    scale -- boolean, if False, the integer levels are kept instead of being scaled as in baseband, eg. for the 'integer'
+             precision policy, only with mmap = True (default = True)
+    
+    """
+    def __init__(self, index, blocksize=2**16, overlap=0, depth=4, workers=2, start=0, stop=None, processes=False, mmap=False, scale=True):
+        from multiprocessing.pool import Pool, ThreadPool
+        
+        # Conditions checking that the block and queue parameters are sensible
+        if blocksize <= 0:
+            raise ValueError('Block size must be positive')
+        elif overlap < 0 or overlap >= blocksize:
+            raise ValueError('Overlap must be non-negative and less than the block size')
+        elif depth < 1 or workers < 1:
+            raise ValueError('Depth and number of workers must be at least 1')
+        elif scale != True and mmap != True:
+            raise ValueError('Unscaled voltages can only be decoded from memory-mapped files (mmap = True)')
+        
+        if stop is None:
+            last = index['files'][-1]
+            stop = last['offset'] + last['frames']*last['samples_per_frame']
+        
+        self.index = index
+        self.blocksize = blocksize
+        self.depth = depth
+        self.mmap = mmap
+        self.scale = scale
+        self.starts = range(start, stop - blocksize + 1, blocksize - overlap) # Start sample of every block
+        
+        if processes == True:
+            self.pool = Pool(workers)
+        else:
+            self.pool = ThreadPool(workers)
+        
+        # Statistics of the queue for sizing the prefetching
+        self.nblocks = 0 # Number of blocks handed to the consumer
+        self.stall = 0. # Total time in seconds the consumer waited for blocks
+        self.depthsum = 0 # Sum over requests of the number of blocks already decoded
+        self.maxdepth = 0 # Largest number of blocks found decoded at a request
+    
+    def __iter__(self):
+        from collections import deque
+        from time import time
+        
+        pending = deque()
+        nsubmitted = 0
+        try:
+            while True:
+                # Keeping the queue topped up with the next blocks
+                while len(pending) < self.depth and nsubmitted < len(self.starts):
+                    pending.append(self.pool.apply_async(dataBlock, (self.index, self.starts[nsubmitted], self.blocksize, None, self.mmap, self.scale)))
+                    nsubmitted += 1
+                
+                if len(pending) == 0:
+                    break
+                
+                ready = sum(1 for result in pending if result.ready())
+                self.depthsum += ready
+                self.maxdepth = max(self.maxdepth, ready)
+                
+                # Waiting for the oldest block, and timing how long the consumer is stalled
+                t0 = time()
+                block = pending.popleft().get()
+                self.stall += time() - t0
+                self.nblocks += 1
+                
+                yield block
+        finally:
+            self.close()
+    
+    def stats(self):
+        """Returns a dictionary of the queue statistics: number of blocks yielded ('blocks'), total stall time in seconds
+        ('stall'), mean stall time per block ('meanstall'), mean and maximum number of blocks already decoded when a block
+        was requested ('meandepth', 'maxdepth') and the configured depth ('depth')
+        """
+        nblocks = max(self.nblocks, 1)
+        return {'blocks': self.nblocks, 'stall': self.stall, 'meanstall': self.stall/nblocks,
+                'meandepth': float(self.depthsum)/nblocks, 'maxdepth': self.maxdepth, 'depth': self.depth}
+    
+    def close(self):
+        """Stops the worker pool"""
+        self.pool.terminate()
+
+
+
+def vdifMap(filename, sample_rate=800/(2.*1024)):
+    """Memory-maps a VDIF file and returns its frame layout, without reading or copying the payloads
+    
+    The header of the first frame gives the frame size, number of channels, bits per sample and complex/real data, and 
+    the thread id of every frame is read directly from the mapped headers. Returns a dictionary with the mapped frames 
+    ('frames', an array of shape (nframes, framebytes) backed by the file), the sorted thread ids ('threads'), the frames 
+    of each thread in time order ('threadframes', slices where the threads are regularly interleaved) and the file layout.
+    
+    Keyword arguments:
+    filename -- String, full path of the VDIF file
+    sample_rate -- Float, sample rate in MHz, used for the start time of the file (default for ARO = 800/2048 MHz)
+    
+    """
+    # Importing required modules
+    import numpy as np
+    from astropy.time import Time
+    import astropy.units as u
+    
+    # Mapping the whole file, and parsing the first header (little-endian 32-bit words)
+    mm = np.memmap(filename, dtype=np.uint8, mode='r')
+    head = mm[:16].view('<u4')
+    framebytes = int(head[2] & 0xffffff)*8 # Frame length is stored in units of 8 bytes
+    if framebytes == 0 or len(mm) % framebytes != 0:
+        raise ValueError('File does not consist of whole VDIF frames of equal length')
+    
+    legacy = bool((head[0] >> 30) & 1)
+    headerbytes = 16 if legacy else 32
+    nchan = 2**int((head[2] >> 24) & 0x1f)
+    bps = int((head[3] >> 26) & 0x1f) + 1
+    complexdata = bool(head[3] >> 31)
+    if complexdata == False or bps not in (4, 8):
+        raise ValueError('Only complex 4-bit and 8-bit VDIF data can be decoded from memory-mapped files')
+    
+    samples_per_frame = (framebytes - headerbytes)*8//(nchan*bps*2)
+    
+    # Viewing the mapped file as frames, and reading the thread id of every frame from its header
+    nframes = len(mm)//framebytes
+    frames = mm.reshape(nframes, framebytes)
+    threadids = (mm.view('<u4').reshape(nframes, framebytes//4)[:,3] >> 16) & 0x3ff
+    threads = np.unique(threadids)
+    
+    threadframes = []
+    nthreadframes = nframes # Number of complete frames available in every thread
+    for tid in threads:
+        idx = np.flatnonzero(threadids == tid)
+        nthreadframes = min(nthreadframes, len(idx))
+        if np.all(np.diff(idx) == len(threads)):
+            idx = slice(int(idx[0]), None, len(threads)) # Regularly interleaved threads need no index arrays
+        threadframes.append(idx)
+    
+    # Start time of the file, from the reference epoch (half-years since 2000), seconds and frame number
+    epoch = int((head[1] >> 24) & 0x3f)
+    tepoch = Time('%04d-%02d-01T00:00:00'%(2000 + epoch//2, 1 + 6*(epoch%2)), format='isot', scale='utc', precision=9)
+    seconds = int(head[0] & 0x3fffffff)
+    framenr = int(head[1] & 0xffffff)
+    tstart = tepoch + seconds*u.s + (framenr*samples_per_frame/(sample_rate*u.MHz)).to(u.s)
+    
+    return {'frames': frames, 'threads': threads, 'threadframes': threadframes, 'nsamples': nthreadframes*samples_per_frame,
+            'headerbytes': headerbytes, 'framebytes': framebytes, 'nchan': nchan, 'bps': bps,
+            'samples_per_frame': samples_per_frame, 'start': tstart.isot}
+
+
+
+_vmaps = {} # Mapped files by path and sample rate, with the size and modification time they were mapped at
+_vmapsorder = []
+_vmapslimit = 16 # Number of mapped files kept, so long observations do not keep every file mapped
+
+
+
+def _cachedMap(filename, sample_rate=800/(2.*1024)):
+    """Returns vdifMap(filename, sample_rate), reusing the map of an earlier call if the file has not changed since, so
+    consecutive blocks of the same file do not re-read every frame header
+    
+    Keyword arguments:
+    filename -- String, full path of the VDIF file
+    sample_rate -- Float, sample rate in MHz (default for ARO = 800/2048 MHz)
+    
+    """
+    # Importing required modules
+    import os
+    
+    stat = os.stat(filename)
+    key = (filename, sample_rate)
+    if key in _vmaps and _vmaps[key][0] == (stat.st_size, stat.st_mtime):
+        return _vmaps[key][1]
+    
+    vmap = vdifMap(filename, sample_rate=sample_rate)
+    if key not in _vmaps:
+        _vmapsorder.append(key)
+        if len(_vmapsorder) > _vmapslimit:
+            del _vmaps[_vmapsorder.pop(0)]
+    _vmaps[key] = ((stat.st_size, stat.st_mtime), vmap)
+    
+    return vmap
+
+
+
+def vdifRead(vmap, start=0, size=None, out=None, batch=4096, scale=True):
+    """Decodes raw voltages from a memory-mapped VDIF file directly into an output array of layout (time, nchan, nthread)
+    
+    Payloads are decoded straight from the mapped file with a lookup table, in batches of frames, so no intermediate
+    copies of the full block are made. The output has the same layout as the output of dataIO, ie. (time, 1024, 2).
+    
+    Keyword arguments:
+    vmap -- Dictionary or String, mapped file as returned by vdifMap, or the path of the file to map
+    start -- int, first time sample to decode (default = 0)
+    size -- int, number of time samples to decode, None decodes to the end of the file (default = None)
+    out -- (OPTIONAL) Complex array, preallocated output array of shape (size, nchan, nthread) to decode into (default = None)
+    batch -- int, number of frames per thread decoded at a time, which bounds the temporary memory (default = 4096)
+    scale -- boolean, if True, levels are scaled as in baseband, if False, the integer levels are kept (default = True)
+    
+    """
+    # Importing required modules
+    import numpy as np
+    
+    if isinstance(vmap, basestring):
+        vmap = vdifMap(vmap)
+    
+    spf = vmap['samples_per_frame']
+    nchan = vmap['nchan']
+    if size is None:
+        size = vmap['nsamples'] - start
+    if start < 0 or start + size > vmap['nsamples']:
+        raise ValueError('Requested samples are outside of the file')
+    
+    if out is None:
+        out = np.empty((size, nchan, len(vmap['threads'])), dtype=np.complex64)
+    elif out.shape != (size, nchan, len(vmap['threads'])):
+        raise ValueError('Output array must have shape (size, nchan, nthread)')
+    
+    # Lookup table from each byte of the payload to its complex sample (4-bit) or component (8-bit)
+    if vmap['bps'] == 4:
+        b = np.arange(256)
+        lut = ((b & 0xf) - 8.) + 1j*((b >> 4) - 8.) # Low nibble is the real part, high nibble the imaginary part
+        if scale == True:
+            lut /= 2.95 # FOUR_BIT_1_SIGMA of baseband
+        lut = lut.astype(out.dtype)
+    else:
+        lut = np.arange(256) - 127.5
+        if scale == True:
+            lut /= 35.5 # EIGHT_BIT_1_SIGMA of baseband
+        lut = lut.astype(out.real.dtype)
+    
+    hb = vmap['headerbytes']
+    payloadbytes = spf*nchan*vmap['bps']*2//8
+    
+    # Range of frames holding the requested samples
+    f0 = start//spf
+    f1 = (start + size - 1)//spf + 1
+    
+    for p in range(len(vmap['threads'])):
+        tf = vmap['threadframes'][p]
+        for fb in range(f0, f1, batch):
+            fe = min(fb + batch, f1)
+            
+            # Selecting the payloads of this batch of frames (a view of the mapped file for interleaved threads)
+            if isinstance(tf, slice):
+                payload = vmap['frames'][tf.start + fb*tf.step:tf.start + fe*tf.step:tf.step, hb:hb+payloadbytes]
+            else:
+                payload = vmap['frames'][tf[fb:fe], hb:hb+payloadbytes]
+            
+            # Samples of this batch which fall within the requested range
+            s0 = max(start - fb*spf, 0)
+            s1 = min(start + size - fb*spf, (fe - fb)*spf)
+            dest = out[fb*spf + s0 - start:fb*spf + s1 - start, :, p]
+            
+            if vmap['bps'] == 4:
+                payload = payload.reshape((fe - fb)*spf, nchan)[s0:s1]
+                dest[...] = lut.take(payload)
+            else:
+                payload = payload.reshape((fe - fb)*spf, nchan, 2)[s0:s1]
+                dest.real = lut.take(payload[:,:,0])
+                dest.imag = lut.take(payload[:,:,1])
+    
+    return out
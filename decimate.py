@@ -1,80 +1,274 @@
-def decimate(data,decfactor=128,polars=1):
+def decimate(data,decfactor=128,polars=1,chunksize=2**13,pyramid=False,precision='double'):
     """Decimates data by a given factor and returns an array of power as well as the power squared (for SK algorithm)
     
     Keyword arguments:
     data -- Array, the data set which you want to decimate
     decfactor -- Factor by which to decimate the data, should be a proper fraction of the size of the data (default = 128)
     polars -- The polarization which you want to decimate and return, options are 1, 2 or 'both' (default = 1)
+    chunksize -- Number of time samples processed at once, which bounds the memory used on top of the output (default = 2**13)
+    pyramid -- If True (or an int giving the number of levels), returns a Pyramid of the decimated outputs at decfactor, 
+               2*decfactor, 4*decfactor... instead of the arrays, with rows ordered as the arrays would be returned (default = False)
+    precision -- Precision policy of the power and decimated sums, 'double', 'single' or 'integer', see precision.precision
+                 (default = 'double')
     """
     print 'Beginning Data Decimation...'
     
     # Importing required modules
     import numpy as np
+    from precision import precision as dtypes
     
-    # Defining variables
-    dims = np.shape(data)
-    nfreqs = dims[1] # Number of frequency channels
-    timelen = dims[0]
+    # Building the pyramid from the stacked outputs at the base decimation factor
+    if pyramid is not False:
+        levels = None if pyramid is True else pyramid
+        if len(np.shape(data)) == 3 and polars == 'both':
+            stack = decimateStack(data,decfactor,chunksize=chunksize,precision=precision)
+        else:
+            polar = None if len(np.shape(data)) == 2 else {1: 0, 2: -1}[polars]
+            stack = np.empty((2,np.shape(data)[1],np.shape(data)[0]/decfactor),dtype=dtypes(precision)['sums'])
+            powerSums(data,decfactor,polar=polar,chunksize=chunksize,S1=stack[0],S2=stack[1],precision=precision)
+        
+        print 'Finished Data Decimation.'
+        return Pyramid(stack,decfactor,levels)
     
-    #Separating the polarizations and getting rid of extra dimension
+    #Separating the polarizations and decimating in a single pass over the voltages
     if len(np.shape(data)) == 2: #If data only consists of a single polarization, continue 
-        data = np.transpose(data)
-        
-        power = (np.real(data)**2. + np.imag(data)**2.) 
-        V4 = power**2 
-        
-        # Decimating data for greater clarity
-        reduced = np.reshape(power, (nfreqs,timelen/decfactor,decfactor)).sum(axis=2)
-        V4reduced = np.reshape(V4, (nfreqs,timelen/decfactor,decfactor)).sum(axis=2)
+        reduced,V4reduced = powerSums(data,decfactor,chunksize=chunksize,precision=precision)
         
         print 'Finished Data Decimation.'
         return reduced,V4reduced
     
     elif polars == 1: 
-        polar = np.squeeze(data[:,:,:1])
-        polar = np.transpose(polar)
-        
-        # Getting power and power squared for calculation of kurtosis 
-        power = (np.real(polar)**2. + np.imag(polar)**2.) 
-        V4 = power**2 
-        
-        # Decimating data for greater clarity
-        reduced = np.reshape(power, (nfreqs,timelen/decfactor,decfactor)).sum(axis=2)
-        V4reduced = np.reshape(V4, (nfreqs,timelen/decfactor,decfactor)).sum(axis=2)
+        reduced,V4reduced = powerSums(data,decfactor,polar=0,chunksize=chunksize,precision=precision)
         
         print 'Finished Data Decimation.'
         return reduced,V4reduced
         
     elif polars == 2:
-        polar = np.squeeze(data[:,:,-1])
-        polar = np.transpose(polar)
-        
-        # Getting power and power squared for calculation of kurtosis 
-        power = (np.real(polar)**2. + np.imag(polar)**2.) 
-        V4 = power**2 
-        
-        # Decimating data for greater clarity
-        reduced = np.reshape(power, (nfreqs,timelen/decfactor,decfactor)).sum(axis=2)
-        V4reduced = np.reshape(V4, (nfreqs,timelen/decfactor,decfactor)).sum(axis=2)
+        reduced,V4reduced = powerSums(data,decfactor,polar=-1,chunksize=chunksize,precision=precision)
         
         return reduced,V4reduced
         
     elif polars == 'both':
-        polar1 = np.squeeze(data[:,:,:1])
-        polar1 = np.transpose(polar1)
-        polar2 = np.squeeze(data[:,:,-1])
-        polar2 = np.transpose(polar2)
-        
-        # Getting power and power squared for calculation of kurtosis 
-        power1 = (np.real(polar1)**2. + np.imag(polar1)**2.) 
-        V41 = power1**2 
-        power2 = (np.real(polar2)**2. + np.imag(polar2)**2.) 
-        V42 = power2**2 
-        
-        # Decimating data for greater clarity
-        reduced1 = np.reshape(power1, (nfreqs,timelen/decfactor,decfactor)).sum(axis=2)
-        V4reduced1 = np.reshape(V41, (nfreqs,timelen/decfactor,decfactor)).sum(axis=2)
-        reduced2 = np.reshape(power2, (nfreqs,timelen/decfactor,decfactor)).sum(axis=2)
-        V4reduced2 = np.reshape(V42, (nfreqs,timelen/decfactor,decfactor)).sum(axis=2)
-        
-        return reduced1,V4reduced1,reduced2,V4reduced2
\ No newline at end of file
+        # Both polarizations are decimated in one traversal of the voltages
+        reduced1,V4reduced1,reduced2,V4reduced2 = decimateStack(data,decfactor,chunksize=chunksize,precision=precision)
+        
+        return reduced1,V4reduced1,reduced2,V4reduced2
+
+
+
+def powerSums(data,decfactor=128,polar=None,chunksize=2**13,S1=None,S2=None,precision='double'):
+    """Returns the decimated sums of power (S1 = sum |V|^2) and power squared (S2 = sum |V|^4) of voltage data
+    
+    The voltages are processed in chunks of time, and the power of each chunk is computed into a reused buffer, summed
+    into S1, squared in place and summed into S2. No full-resolution power or power squared arrays are created, so the
+    memory used on top of the outputs is bounded by the chunk size rather than the length of the data. 
+    
+    Keyword arguments:
+    data -- Array, voltages of shape (time, frequency) or (time, frequency, polarization)
+    decfactor -- Factor by which to decimate the data, should be a proper fraction of the size of the data (default = 128)
+    polar -- Index of the polarization to use for 3-dimensional data (eg. 0 or -1), None for 2-dimensional data (default = None)
+    chunksize -- Number of time samples processed at once, rounded down to a multiple of decfactor (default = 2**13)
+    S1 -- (OPTIONAL) Array, preallocated output of shape (frequency, time/decfactor) for the sums of power (default = None)
+    S2 -- (OPTIONAL) Array, preallocated output of shape (frequency, time/decfactor) for the sums of power squared (default = None)
+    precision -- Precision policy of the power and decimated sums, 'double', 'single' or 'integer', see precision.precision
+                 (default = 'double')
+    """
+    # Importing required modules
+    import numpy as np
+    from precision import precision as dtypes, checkVoltages
+    
+    policy = dtypes(precision)
+    
+    # Defining variables
+    dims = np.shape(data)
+    nfreqs = dims[1] # Number of frequency channels
+    timelen = dims[0]
+    
+    if timelen % decfactor != 0:
+        raise ValueError('Decimation factor is not a proper fraction of data length')
+    
+    # Outputs in the same (frequency, time) orientation as the rest of the package
+    if S1 is None:
+        S1 = np.empty((nfreqs,timelen/decfactor),dtype=policy['sums'])
+    if S2 is None:
+        S2 = np.empty((nfreqs,timelen/decfactor),dtype=policy['sums'])
+    
+    # Number of decimated pixels per chunk, and buffers which are reused for every chunk
+    nwin = max(chunksize/decfactor, 1)
+    power = np.empty((nwin*decfactor,nfreqs),dtype=policy['power'])
+    imag2 = np.empty((nwin*decfactor,nfreqs),dtype=policy['power'])
+    
+    for w0 in range(0,timelen/decfactor,nwin):
+        w1 = min(w0 + nwin, timelen/decfactor)
+        n = (w1 - w0)*decfactor
+        
+        if polar is None:
+            V = data[w0*decfactor:w1*decfactor]
+        else:
+            V = data[w0*decfactor:w1*decfactor,:,polar]
+        
+        checkVoltages(V,policy) # Integer power is only exact for integer-valued voltages
+        
+        # Power of the chunk, |V|^2 = Re^2 + Im^2, without complex or full-size temporaries
+        p = power[:n]
+        q = imag2[:n]
+        np.multiply(V.real,V.real,out=p,casting='unsafe')
+        np.multiply(V.imag,V.imag,out=q,casting='unsafe')
+        p += q
+        
+        # Summing over each group of decfactor samples, then squaring in place for the power squared
+        S1[:,w0:w1] = p.reshape(w1-w0,decfactor,nfreqs).sum(axis=1,dtype=policy['sums']).T
+        p *= p
+        S2[:,w0:w1] = p.reshape(w1-w0,decfactor,nfreqs).sum(axis=1,dtype=policy['sums']).T
+    
+    return S1,S2
+
+
+
+
+def decimateStack(data,decfactor=128,stokes=False,chunksize=2**13,out=None,precision='double'):
+    """Decimates both polarizations in a single pass and returns one stacked array of S1/S2 and (optionally) Stokes parameters
+    
+    The output has shape (4, frequency, time/decfactor), or (8, frequency, time/decfactor) if stokes is True, with rows
+    [S1 pol 1, S2 pol 1, S1 pol 2, S2 pol 2] followed by the decimated Stokes parameters [I, Q, U, V], where 
+    I = |X|^2 + |Y|^2, Q = |X|^2 - |Y|^2, U = 2Re(X Y*) and V = 2Im(X* Y) for the two polarizations X and Y. 
+    Each chunk of voltages is read once for all outputs, so dual-polarization decimation costs one memory traversal.
+    
+    Keyword arguments:
+    data -- Array, voltages of shape (time, frequency, polarization) with two polarizations
+    decfactor -- Factor by which to decimate the data, should be a proper fraction of the size of the data (default = 128)
+    stokes -- boolean, if True, the decimated Stokes parameters I, Q, U and V are also returned (default = False)
+    chunksize -- Number of time samples processed at once, rounded down to a multiple of decfactor (default = 2**13)
+    out -- (OPTIONAL) Array, preallocated output of shape (4 or 8, frequency, time/decfactor) (default = None)
+    precision -- Precision policy of the power and decimated sums, 'double', 'single' or 'integer', see precision.precision
+                 (default = 'double')
+    """
+    # Importing required modules
+    import numpy as np
+    from precision import precision as dtypes, checkVoltages
+    
+    policy = dtypes(precision)
+    
+    # Defining variables
+    dims = np.shape(data)
+    nfreqs = dims[1] # Number of frequency channels
+    timelen = dims[0]
+    
+    if len(dims) != 3 or dims[2] != 2:
+        raise ValueError('Data must have shape (time, frequency, 2)')
+    elif timelen % decfactor != 0:
+        raise ValueError('Decimation factor is not a proper fraction of data length')
+    
+    nout = 8 if stokes == True else 4
+    if out is None:
+        out = np.empty((nout,nfreqs,timelen/decfactor),dtype=policy['sums'])
+    
+    # Number of decimated pixels per chunk, and buffers which are reused for every chunk
+    nwin = max(chunksize/decfactor, 1)
+    buffers = np.empty((3,nwin*decfactor,nfreqs),dtype=policy['power'])
+    
+    for w0 in range(0,timelen/decfactor,nwin):
+        w1 = min(w0 + nwin, timelen/decfactor)
+        n = (w1 - w0)*decfactor
+        
+        V = data[w0*decfactor:w1*decfactor] # Both polarizations of the chunk, read once
+        checkVoltages(V,policy) # Integer power is only exact for integer-valued voltages
+        X = V[:,:,0]
+        Y = V[:,:,-1]
+        p = buffers[0,:n]
+        q = buffers[1,:n]
+        tmp = buffers[2,:n]
+        
+        # Power and power squared of each polarization
+        for i,polar in enumerate((X,Y)):
+            np.multiply(polar.real,polar.real,out=p,casting='unsafe')
+            np.multiply(polar.imag,polar.imag,out=tmp,casting='unsafe')
+            p += tmp
+            out[2*i,:,w0:w1] = p.reshape(w1-w0,decfactor,nfreqs).sum(axis=1,dtype=policy['sums']).T
+            p *= p
+            out[2*i+1,:,w0:w1] = p.reshape(w1-w0,decfactor,nfreqs).sum(axis=1,dtype=policy['sums']).T
+        
+        if stokes == True:
+            # Cross-polarization products, U = 2(XrYr + XiYi) and V = 2(XrYi - XiYr)
+            np.multiply(X.real,Y.real,out=p,casting='unsafe')
+            np.multiply(X.imag,Y.imag,out=tmp,casting='unsafe')
+            p += tmp
+            np.multiply(X.real,Y.imag,out=q,casting='unsafe')
+            np.multiply(X.imag,Y.real,out=tmp,casting='unsafe')
+            q -= tmp
+            out[6,:,w0:w1] = 2*p.reshape(w1-w0,decfactor,nfreqs).sum(axis=1,dtype=policy['sums']).T
+            out[7,:,w0:w1] = 2*q.reshape(w1-w0,decfactor,nfreqs).sum(axis=1,dtype=policy['sums']).T
+    
+    if stokes == True:
+        # Stokes I and Q follow directly from the decimated power of each polarization
+        np.add(out[0],out[2],out=out[4])
+        np.subtract(out[0],out[2],out=out[5])
+    
+    return out
+
+
+
+class Pyramid(object):
+    """Power-of-two decimation pyramid of decimated data, held in one contiguous buffer
+    
+    Level 0 is the input data at decimation factor decfactor, and each following level is derived from the previous one by
+    summing adjacent pairs of pixels along the time axis, so level k is decimated by decfactor*2**k. All levels are stored 
+    one after the other along the time axis of a single buffer of shape (quantities, frequency, total time), and level(k)
+    returns a view into it, so re-decimating the same data for SK, SumThreshold, radiometer or plotting costs nothing. 
+    
+    Keyword arguments:
+    data -- Array, decimated data of shape (frequency, time), or (quantities, frequency, time) for stacked outputs such as 
+            those of decimateStack (sums are valid for additive quantities like S1, S2 and Stokes parameters)
+    decfactor -- Factor by which the input data has been decimated (default = 128)
+    levels -- Number of levels above level 0, None builds levels while the time axis length stays even (default = None)
+    """
+    def __init__(self,data,decfactor=128,levels=None):
+        import numpy as np
+        
+        data = np.asarray(data)
+        self.squeeze = data.ndim == 2 # Single quantity, levels are returned as 2-dimensional arrays
+        if self.squeeze:
+            data = data[np.newaxis]
+        
+        timelen = np.shape(data)[2]
+        if levels is None:
+            levels = 0
+            while (timelen >> levels) % 2 == 0 and (timelen >> levels) > 1:
+                levels += 1
+        elif timelen % 2**levels != 0:
+            raise ValueError('Time axis length is not divisible by 2**levels')
+        
+        # Offsets of each level along the time axis of the buffer
+        lengths = [timelen >> k for k in range(levels+1)]
+        self.offsets = np.concatenate(([0],np.cumsum(lengths)))
+        self.decfactor = decfactor
+        self.levels = levels
+        self.buffer = np.empty(np.shape(data)[:2] + (self.offsets[-1],), dtype=data.dtype)
+        
+        # Each level is the pairwise sum of the one below it
+        self.buffer[:,:,:timelen] = data
+        for k in range(1,levels+1):
+            prev = self._level(k-1)
+            np.add(prev[:,:,0::2],prev[:,:,1::2],out=self._level(k))
+    
+    def _level(self,k):
+        return self.buffer[:,:,self.offsets[k]:self.offsets[k+1]]
+    
+    def level(self,k):
+        """Returns a view of level k, decimated by decfactor*2**k"""
+        if k < 0 or k > self.levels:
+            raise ValueError('Pyramid has no level %s'%k)
+        if self.squeeze:
+            return self._level(k)[0]
+        return self._level(k)
+    
+    def factor(self,k):
+        """Returns the total decimation factor of level k"""
+        return self.decfactor*2**k
+    
+    def find(self,decfactor):
+        """Returns the level with a total decimation factor of decfactor"""
+        for k in range(self.levels+1):
+            if self.factor(k) == decfactor:
+                return k
+        raise ValueError('Pyramid has no level decimated by %s'%decfactor)
\ No newline at end of file
@@ -0,0 +1,63 @@
+def precision(policy='double'):
+    """Returns the numpy dtypes used across the pipeline (decimate, SK, SumThreshold, radiometer) for a precision policy
+    
+    Returns a dictionary with the dtype of the full-resolution power computed from the voltages ('power'), of the decimated
+    sums S1 and S2 ('sums'), of derived floating point quantities such as the SK estimator, the SumThreshold working copy 
+    and the radiometer statistics ('float'), and of the flagging masks ('mask').
+    
+    Policies:
+    'double' -- float64 power, sums and derived quantities, float64 masks (the original behaviour of the package)
+    'single' -- float32 power, sums and derived quantities, bool masks (half the memory bandwidth of 'double')
+    'integer' -- int32 power and int64 sums for integer-valued quantized voltages, such as 4-bit ARO data read with 
+                 mmap = True and scale = False (dataIO, dataBlock, Prefetcher or vdifRead), float64 derived quantities, 
+                 uint8 masks. Voltages which are not integer-valued (eg. scaled or up-channelized voltages, or the default
+                 scale = True of the readers) are rejected with a ValueError, see checkVoltages.
+    
+    Precision guarantees for the SK estimator at M = 128:
+    'integer' -- S1 and S2 are exact for any decimation factor, and SK is computed in float64 from exact sums, so its 
+                 error is a few float64 ulps (~1E-15), negligible against the SK standard deviation sqrt(4/M) ~ 0.18.
+    'single' -- For integer-valued 4-bit voltages, |V|^2 <= 128 and |V|^4 <= 16384 are exact in float32, and so are S1 and 
+                S2 (S2 <= 128*16384 = 2**21 < 2**24), so SK differs from 'double' only by its float32 evaluation, 
+                |dSK| < 1E-6. This stays exact up to a decimation factor of 1024. For scaled voltages (baseband or 
+                vdifRead(scale=True)), S1 and S2 carry a relative error of at most ~M*2**-24 ~ 8E-6 each, bounding the 
+                SK error by |dSK| < 5E-5, ie. less than 3E-4 of the SK standard deviation, which leaves the masks unchanged
+                except for pixels within ~5E-5 of a threshold.
+    
+    Keyword arguments:
+    policy -- String, name of the precision policy, 'double', 'single' or 'integer' (default = 'double')
+    """
+    # Importing required modules
+    import numpy as np
+    
+    policies = {'double': {'power': np.float64, 'sums': np.float64, 'float': np.float64, 'mask': np.float64},
+                'single': {'power': np.float32, 'sums': np.float32, 'float': np.float32, 'mask': np.bool_},
+                'integer': {'power': np.int32, 'sums': np.int64, 'float': np.float64, 'mask': np.uint8}}
+    
+    if policy not in policies:
+        raise ValueError('Unknown precision policy, options are %s'%', '.join(sorted(policies)))
+    
+    return policies[policy]
+
+
+
+def checkVoltages(V, policy):
+    """Raises a ValueError if voltages can not be converted exactly to the power dtype of a precision policy
+    
+    Only the 'integer' policy is restricted: its int32 power is exact for voltages of an integer dtype or integer-valued
+    floats (eg. dataBlock(mmap=True, scale=False)), and would silently truncate scaled voltages (baseband, vdifRead(scale=True)).
+    
+    Keyword arguments:
+    V -- Array of voltages (eg. a chunk of the data being decimated)
+    policy -- Dictionary of dtypes returned by precision
+    """
+    # Importing required modules
+    import numpy as np
+    
+    if np.dtype(policy['power']).kind not in 'iu' or np.asarray(V).real.dtype.kind in 'iu':
+        return
+    
+    for part in (np.real(V), np.imag(V)):
+        if not np.all(part == np.round(part)):
+            raise ValueError("The 'integer' precision policy requires integer-valued voltages (eg. dataBlock(mmap=True, scale=False)), "
+                             "use 'single' or 'double' for scaled voltages")
+
@@ -1,143 +1,457 @@
-def radiometer(data, chunklen, data2=None, label1=None, label2=None, savefig=False, decfactor=128, bandwidth=0.390625 * (10**6)): 
+def radiometer(data, chunklen, data2=None, label1=None, label2=None, savefig=False, decfactor=128, bandwidth=0.390625 * (10**6), level=0, precision='double', plot=True, mask=None, mask2=None):
     '''Function which uses the radiometer equation as a quality metric for comparing RFI excision methods.
     
-    The function iterates along frequency channels in chunks, and uses these chunks to compute the value of the 
-    radiometer equation. The function produces histograms of the computed values of the radiometer equation and
-    counts the number of outliers. 
+    The function splits frequency channels in chunks, and uses these chunks to compute the value of the
+    radiometer equation (see radiometerValues). The function produces histograms of the computed values of the
+    radiometer equation and counts the number of outliers.
     
     Keyword arguments:
-    data -- Input data set 
+    data -- Input data set
     chunklen -- The length of the chunks which the algorithm will use
     data2 -- (OPTIONAL) Second data set, for comparison purposes
     label1 -- (OPTIONAL) Plot labels for first input data set (default = 'Data 1')
     label2 -- (OPTIONAL) Plot labels for second input data set (default = 'Data 2')
     savefig -- (OPTIONAL) Set to 'True' if you want to save the resulting histogram, will prompt for a filename
-               and then saves to the working directory (default = 'False')
+               and then saves to the working directory, or a filename to save to without prompting (default = 'False')
     decfactor -- (OPTIONAL) Factor by which the data sets have been decimated by (should be same for both sets) (default = 128)
     bandwidth -- (OPTIONAL) Bandwidth of each frequency channel (default for ARO = 0.390625 * (10**6) Hz)
-            
+    level -- (OPTIONAL) If the data sets are Pyramids from decimate, the level to use, decfactor is then taken from the
+             pyramid of the first data set (default = 0)
+    precision -- (OPTIONAL) Precision policy setting the dtype in which chunk means and RMS are accumulated, 'double',
+                 'single' or 'integer', see precision.precision (default = 'double')
+    plot -- (OPTIONAL) Set to 'False' to only compute and print the outlier percentages, without importing matplotlib
+            (default = 'True')
+    mask -- (OPTIONAL) Mask of the first data set returned by SK or SumThreshold (dense, or a PackedMask or RLEMask), 
+            flagged samples are excluded from the chunk statistics (default = None)
+    mask2 -- (OPTIONAL) Mask of the second data set (default = None)
+    
+    '''
+    
+    # Importing modules
+    from decimate import Pyramid
+    
+    if isinstance(data, Pyramid):
+        decfactor = data.factor(level)
+    
+    # Radiometer values and outlier percentages, computed for every chunk at once
+    data1rad, data1outlierpercent = radiometerValues(data, chunklen, decfactor=decfactor, bandwidth=bandwidth, level=level, precision=precision, mask=mask)
+    
+    if label1 == None: # Setting legend labels based on input, otherwise set to default label
+        label1 = 'Data 1'
+    
+    # Case for if two data sets are provided
+    if data2 is not None:
+        data2rad, data2outlierpercent = radiometerValues(data2, chunklen, decfactor=decfactor, bandwidth=bandwidth, level=level, precision=precision, upper=1.175, mask=mask2)
+        
+        if label2 == None:
+            label2 = 'Data 2'
+        
+        if plot == True: # Histogram of Radiometer Equation for data 1 and data 2
+            radiometerPlot([data1rad, data2rad], [label1, label2], 'Radiometer Quality Metric Using Time-Chunks of Length %s'%(chunklen), savefig)
+        
+        print 'Outlier percentage of data set 1 using time chunks of length ', chunklen,':', data1outlierpercent
+        print 'Outlier percentage of data set 2 using time chunks of length', chunklen,':', data2outlierpercent
+        
+        return (data1outlierpercent - data2outlierpercent)
+    
+    # Case for if only one data set is provided
+    else:
+        if plot == True: # Histogram of Radiometer Equation for data 1
+            radiometerPlot([data1rad], [label1], 'Radiometer Quality Metric Using Time-Chunks of Length %s, Outliers = %s%%'%(chunklen,data1outlierpercent), savefig)
+        
+        print 'Outlier percentage of data set 1 using time chunks of length ', chunklen,':', data1outlierpercent
+        
+        return
+
+
+
+def radiometerValues(data, chunklen, decfactor=128, bandwidth=0.390625 * (10**6), level=0, precision='double', upper=1.125, lower=0.825, mask=None, chunksize=2**13):
+    '''Computes the radiometer equation quality metric of every time chunk of every frequency channel, without plotting.
+    
+    The data is reshaped to (channels, chunks, chunklen), and the mean and RMS of every chunk are computed in one call.
+    The radiometer value of a chunk is mean/(RMS*sqrt(bandwidth*t)), with t the time per pixel, and is 1 for pure noise.
+    With a mask, the count, sum and sum of squares of the unflagged samples of every chunk are accumulated over blocks of
+    chunksize time samples, so the mask and the buffer of the accumulation dtype only ever cover one block, and no 
+    cleaned copy of the data is made. Flagged samples are never read (they may be nan or inf, eg. excised data), and 
+    fully flagged chunks get a value of 0.
+    
+    Keyword arguments:
+    data -- Input data set of shape (frequency, time), or a Pyramid from decimate
+    chunklen -- The length of the chunks which the algorithm will use
+    decfactor -- (OPTIONAL) Factor by which the data set has been decimated by (default = 128)
+    bandwidth -- (OPTIONAL) Bandwidth of each frequency channel (default for ARO = 0.390625 * (10**6) Hz)
+    level -- (OPTIONAL) If the data set is a Pyramid from decimate, the level to use, decfactor is then taken from the
+             pyramid (default = 0)
+    precision -- (OPTIONAL) Precision policy setting the dtype in which chunk means and RMS are accumulated, 'double',
+                 'single' or 'integer', see precision.precision (default = 'double')
+    upper -- (OPTIONAL) Values above this limit are counted as outliers (default = 1.125)
+    lower -- (OPTIONAL) Values below this limit are counted as outliers (default = 0.825)
+    mask -- (OPTIONAL) Mask of the same shape as the data returned by SK or SumThreshold (dense, or a PackedMask or 
+            RLEMask), flagged samples are excluded from the chunk statistics (default = None)
+    chunksize -- (OPTIONAL) Number of time samples processed at once with a mask, rounded down to a multiple of chunklen
+                 (default = 2**13)
+    
+    Returns:
+    rad -- Array of shape (channels, chunks) of radiometer values, inf or nan values are set to 0 (excluded from the
+           histograms and never outliers)
+    outlierpercent -- Percentage of the chunks which are outliers
     '''
     
     # Importing modules
     import numpy as np
-    import matplotlib.pyplot as plt
-    from os import getcwd
+    from decimate import Pyramid
+    from precision import precision as dtypes
     
+    policy = dtypes(precision)
     
-    # Defining variables 
-    tsamp = 2.560000E-6 # Time per sample 
+    # Taking the power of the first polarization, and its decimation factor, from a pyramid level
+    if isinstance(data, Pyramid):
+        decfactor = data.factor(level)
+        data = data.level(level)
+        if len(np.shape(data)) == 3:
+            data = data[0]
+    
+    # Defining variables
+    tsamp = 2.560000E-6 # Time per sample
     t = tsamp * decfactor # Time per pixel
+    dims = np.shape(data)
     
     # Conditions checking that chosen chunk length is proper given input data
-    if chunklen > np.shape(data)[1] or chunklen == 0:
+    if chunklen > dims[1] or chunklen == 0:
         raise ValueError('Improper chunk length')
     
-    elif (np.shape(data)[1])%chunklen != 0:
+    elif dims[1]%chunklen != 0:
         raise ValueError('Chunk length is not a proper fraction of data length')
     
+    # Mean and RMS of every time chunk in every freq channel, then comparing to radiometer equation
+    chunks = np.reshape(data, (dims[0], dims[1]/chunklen, chunklen))
+    if mask is None:
+        chunkmean = np.mean(chunks, axis=2, dtype=policy['float'])
+        chunkRMS = np.std(chunks, axis=2, dtype=policy['float'])
     else:
-        # Loop to calculate mean and RMS in chunks in each freq channel for data set 1, then comparing to radiometer equation
-        outliercount = 0 # Counter to keep track of outliers
-        data1rad = []
-        for i in range(np.shape(data)[0]):
-            channel = data[i]
-            for j in np.arange(0,len(channel),chunklen):
-                chunk = channel[j:j+chunklen]
-                chunkmean = np.mean(chunk) # Calculating mean and RMS in each time chunk
-                chunkRMS = np.std(chunk)
-                rad = chunkmean/(chunkRMS*np.sqrt(bandwidth*t)) # radiometer equation
-                if np.isnan(rad) == True or np.isinf(rad) == True:
-                    data1rad.append(0) # If value of rad is inf or nan, set to 0, then exclude from histogram
-                elif rad > 1.125 or rad < 0.825: # Condition to count number of outliers
-                    outliercount += 1
-                    data1rad.append(rad)
-                else:
-                    data1rad.append(rad)
-
-        # Converting to array for histogramming
-        data1rad = np.array(data1rad)
-
-        # Calculating the percentage of outliers
-        data1outlierpercent = (np.float(outliercount)/np.float(len(data1rad)))*100
-
-        # Case for if two data sets are provided
-        if data2 != None:
-            # Same loop as above to calculate mean and RMS in chunks in each freq channel for second (optional) data set
-            outliercount2 = 0 # Counter to keep track of outliers
-            data2rad = []
-            for i in range(np.shape(data2)[0]):
-                channel = data2[i]
-                for j in np.arange(0,len(channel),chunklen):
-                    chunk = channel[j:j+chunklen]
-                    chunkmean = np.mean(chunk[chunk!=np.float('NaN')]) # Calculating mean and RMS in each time chunk
-                    chunkRMS = np.std(chunk[chunk!=np.float('NaN')])
-                    rad = chunkmean/(chunkRMS*np.sqrt(bandwidth*t)) # radiometer equation
-                    if np.isnan(rad) == True or np.isinf(rad) == True:
-                        data2rad.append(0) # If value of rad is inf or nan, set to 0, then exclude from histogram
-                    elif rad > 1.175 or rad < 0.825: # Condition to count number of outliers
-                        outliercount2 += 1
-                        data2rad.append(rad)
-                    else:
-                        data2rad.append(rad)
-
-            # Converting to array for histogramming
-            data2rad = np.array(data2rad)
-
-            # Calculating the percentage of outliers
-            data2outlierpercent = (np.float(outliercount2)/np.float(len(data2rad)))*100
-
-            # Histogram of Radiometer Equation for data 1 and data 2
-            plt.figure(figsize=[10,10])
-            plt.title('Radiometer Quality Metric Using Time-Chunks of Length %s'%(chunklen))
-            
-            if label1 == None: # Setting legend labels based on input, otherwise set to default label
-                label1 = 'Data 1'
-                
-            if label2 == None:
-                label2 = 'Data 2'
-                
-            n, bins, patches = plt.hist(data1rad.flatten()[data1rad!=0],range=(0,4), bins=200, alpha=0.5, log=True, label=label1)
-            n, bins, patches = plt.hist(data2rad.flatten()[data2rad!=0], range=(0,4), bins=200, alpha=0.5, log=True, label=label2)
-            plt.xlabel('Value of Radiometer Metric')
-            plt.ylabel('#')
-            plt.legend(loc='upper right')
-            
-            
-            if savefig == True:
-                fname = raw_input('Enter a file name...')
-                fpath = getcwd() # Extracting working directory using os.getcwd and using this as save location
-                plt.savefig('%s/%s'%(fpath,fname))
-                print 'File saved to %s/%s.png'%(fpath,fname)
+        count = np.zeros((dims[0], dims[1]/chunklen), dtype=policy['float'])
+        S1 = np.zeros((dims[0], dims[1]/chunklen), dtype=policy['float'])
+        S2 = np.zeros((dims[0], dims[1]/chunklen), dtype=policy['float'])
+        
+        step = max(chunksize - chunksize%chunklen, chunklen) # Whole chunks per block
+        for start in range(0, dims[1], step):
+            stop = min(start + step, dims[1])
+            block = slice(start/chunklen, stop/chunklen)
             
-            plt.show()
+            # Buffer of the block in the accumulation dtype, holding 1 for unflagged and 0 for flagged samples, then the
+            # unflagged values (flagged samples are never read, so they may hold nan or inf), then their squares
+            unflagged = np.reshape(_unflagged(mask, dims, start, stop), (dims[0], -1, chunklen))
+            buf = unflagged.astype(policy['float'])
+            count[:, block] = buf.sum(axis=2)
+            np.multiply(chunks[:, block], buf, out=buf, where=unflagged)
+            S1[:, block] = buf.sum(axis=2)
+            np.multiply(buf, buf, out=buf)
+            S2[:, block] = buf.sum(axis=2)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chunkmean = S1/count
+            chunkRMS = np.sqrt(np.maximum(S2/count - chunkmean**2, 0))
+    
+    return radiometerOutliers(chunkmean, chunkRMS, bandwidth*t, upper, lower)
+
+
+
+def radiometerOutliers(chunkmean, chunkRMS, bandwidth_t, upper=1.125, lower=0.825):
+    '''Returns the radiometer values of chunks from their means and RMS, and the percentage of outliers.
+    
+    Keyword arguments:
+    chunkmean -- Array of the mean of every chunk
+    chunkRMS -- Array of the RMS of every chunk
+    bandwidth_t -- Product of the channel bandwidth and the time per pixel
+    upper -- (OPTIONAL) Values above this limit are counted as outliers (default = 1.125)
+    lower -- (OPTIONAL) Values below this limit are counted as outliers (default = 0.825)
+    '''
+    
+    # Importing modules
+    import numpy as np
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rad = chunkmean/(chunkRMS*np.sqrt(bandwidth_t)) # radiometer equation
+    finite = np.isfinite(rad)
+    rad[~finite] = 0 # If value of rad is inf or nan, set to 0, then exclude from histogram
+    
+    # Calculating the percentage of outliers
+    outliers = finite & ((rad > upper) | (rad < lower))
+    outlierpercent = (np.float(np.count_nonzero(outliers))/np.float(np.size(rad)))*100
+    
+    return rad, outlierpercent
+
 
-            print 'Outlier percentage of data set 1 using time chunks of length ', chunklen,':', data1outlierpercent
-            print 'Outlier percentage of data set 2 using time chunks of length', chunklen,':', data2outlierpercent
 
-            return (data1outlierpercent - data2outlierpercent)
+def radiometerSweep(data, chunklens, data2=None, decfactor=128, bandwidth=0.390625 * (10**6), level=0, mask=None, mask2=None):
+    '''Computes the radiometer values and outlier percentages for several chunk lengths in a single pass over the data.
+    
+    Prefix sums of x and x^2 along each channel (after subtracting the channel mean, so the variances do not lose 
+    precision to cancellation) are built once, in double precision. The sum and sum of squares of any chunk is then the
+    difference of two prefix sums, so every chunk length costs O(number of chunks) instead of a new pass over the data. 
+    Chunks containing nan or inf values get a radiometer value of 0, as in radiometerValues. With masks, flagged samples
+    (which may hold any value) are left out of the prefix sums, and a prefix count of unflagged samples gives the number of
+    samples in each chunk.
+    
+    Keyword arguments:
+    data -- Input data set of shape (frequency, time), or a Pyramid from decimate
+    chunklens -- List of chunk lengths, each a proper fraction of the data length
+    data2 -- (OPTIONAL) Second data set, for comparison purposes (outliers above 1.175 instead of 1.125, as in radiometer)
+    decfactor -- (OPTIONAL) Factor by which the data sets have been decimated by (default = 128)
+    bandwidth -- (OPTIONAL) Bandwidth of each frequency channel (default for ARO = 0.390625 * (10**6) Hz)
+    level -- (OPTIONAL) If the data sets are Pyramids from decimate, the level to use, decfactor is then taken from the
+             pyramid of the first data set (default = 0)
+    mask -- (OPTIONAL) Mask of the first data set returned by SK or SumThreshold (dense, or a PackedMask or RLEMask), 
+            flagged samples are excluded from the chunk statistics (default = None)
+    mask2 -- (OPTIONAL) Mask of the second data set (default = None)
+    
+    Returns:
+    A dictionary mapping each chunk length to the (rad, outlierpercent) tuple of radiometerValues, or with data2, a tuple 
+    of two such dictionaries
+    '''
+    
+    # Importing modules
+    import numpy as np
+    from decimate import Pyramid
+    
+    if isinstance(data, Pyramid):
+        decfactor = data.factor(level)
+    
+    tsamp = 2.560000E-6 # Time per sample
+    t = tsamp * decfactor # Time per pixel
+    
+    results = []
+    for dataset, upper, datamask in [(data, 1.125, mask), (data2, 1.175, mask2)]:
+        if dataset is None:
+            continue
         
-        # Case for if only one data set is provided
-        else: 
-            # Histogram of Radiometer Equation for data 1 and data 2
-            plt.figure(figsize=[10,10])
-            plt.title('Radiometer Quality Metric Using Time-Chunks of Length %s, Outliers = %s%%'%(chunklen,data1outlierpercent))
-            
-            if label1 == None: # Setting legend labels based on input, otherwise set to default label
-                label1 = 'Data 1'
+        # Taking the power of the first polarization from a pyramid level
+        if isinstance(dataset, Pyramid):
+            dataset = dataset.level(level)
+            if len(np.shape(dataset)) == 3:
+                dataset = dataset[0]
+        dims = np.shape(dataset)
+        
+        # Conditions checking that the chosen chunk lengths are proper given input data
+        for chunklen in chunklens:
+            if chunklen > dims[1] or chunklen == 0:
+                raise ValueError('Improper chunk length')
+            elif dims[1]%chunklen != 0:
+                raise ValueError('Chunk length is not a proper fraction of data length')
+        
+        # Prefix sums of the mean-subtracted unflagged values, their squares, and the numbers of unflagged and of nan or 
+        # inf values
+        x = np.array(dataset, dtype='float64')
+        unflagged = np.ones(dims, dtype=bool) if datamask is None else _unflagged(datamask, dims)
+        bad = ~np.isfinite(x) & unflagged
+        x[bad | ~unflagged] = 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            offset = x.sum(axis=1)/(unflagged.sum(axis=1) - bad.sum(axis=1)) # Mean of the finite values of each channel
+        offset[~np.isfinite(offset)] = 0
+        x -= offset[:,np.newaxis]
+        x[bad | ~unflagged] = 0
+        P1 = np.zeros((dims[0], dims[1]+1))
+        P2 = np.zeros((dims[0], dims[1]+1))
+        Pcount = np.zeros((dims[0], dims[1]+1), dtype='int64')
+        Pbad = np.zeros((dims[0], dims[1]+1), dtype='int64')
+        np.cumsum(x, axis=1, out=P1[:,1:])
+        np.cumsum(x**2, axis=1, out=P2[:,1:])
+        np.cumsum(unflagged, axis=1, out=Pcount[:,1:])
+        np.cumsum(bad, axis=1, out=Pbad[:,1:])
+        
+        sweep = {}
+        for chunklen in chunklens:
+            # Sums over every chunk, from the prefix sums at the chunk boundaries
+            S1 = np.diff(P1[:,::chunklen], axis=1)
+            S2 = np.diff(P2[:,::chunklen], axis=1)
+            count = np.diff(Pcount[:,::chunklen], axis=1)
+            nbad = np.diff(Pbad[:,::chunklen], axis=1)
             
-            n, bins, patches = plt.hist(data1rad.flatten()[data1rad!=0],range=(0,4), bins=200, alpha=0.5, log=True, label=label1)
-            plt.xlabel('Value of Radiometer Metric')
-            plt.ylabel('#')
-            plt.legend(loc='upper right')
+            with np.errstate(invalid='ignore', divide='ignore'):
+                chunkmean = S1/count + offset[:,np.newaxis]
+                chunkRMS = np.sqrt(np.maximum(S2/count - (S1/count)**2, 0))
+            chunkmean[nbad > 0] = np.nan # Chunks with nan or inf values, or fully flagged, are set to 0 below
             
-            if savefig == True:
-                fname = raw_input('Enter a file name...')
-                fpath = getcwd()
-                plt.savefig('%s/%s'%(fpath,fname))
-                print 'File saved to %s/%s.png'%(fpath,fname)
-                
-            plt.show()
+            sweep[chunklen] = radiometerOutliers(chunkmean, chunkRMS, bandwidth*t, upper)
+        results.append(sweep)
+    
+    if len(results) == 2:
+        return results[0], results[1]
+    return results[0]
+
+
+
+class RadiometerAccumulator(object):
+    '''Accumulates radiometer values over many blocks or files into fixed-bin histograms, outlier counts and moment sums.
+    
+    Every update adds the values of a block (eg. from radiometerValues, or computed from data with updateData) to the 
+    counts of fixed histogram bins, so the quality metric of a whole night is obtained without keeping the values. 
+    Accumulators from different worker processes are combined with merge (all counts are sums), and saved to and loaded 
+    from small JSON files. Values of 0 (inf or nan, or fully flagged chunks) are counted as chunks but excluded from the 
+    histogram and moments, as in radiometer.
+    
+    Keyword arguments:
+    bins -- (OPTIONAL) Number of histogram bins (default = 200)
+    histrange -- (OPTIONAL) Range of the histogram (default = (0,4))
+    upper -- (OPTIONAL) Values above this limit are counted as outliers (default = 1.125)
+    lower -- (OPTIONAL) Values below this limit are counted as outliers (default = 0.825)
+    filename -- (OPTIONAL) File saved with save to load the accumulator from, the other arguments are then ignored 
+                (default = None)
+    '''
+    def __init__(self, bins=200, histrange=(0,4), upper=1.125, lower=0.825, filename=None):
+        import json
+        import numpy as np
+        
+        if filename is not None:
+            with open(filename) as f:
+                saved = json.load(f)
+            bins, histrange, upper, lower = saved['bins'], tuple(saved['histrange']), saved['upper'], saved['lower']
+        
+        self.bins = bins
+        self.histrange = (float(histrange[0]), float(histrange[1]))
+        self.upper = upper
+        self.lower = lower
+        self.edges = np.linspace(self.histrange[0], self.histrange[1], bins+1)
+        
+        self.counts = np.zeros(bins, dtype='int64') # Histogram counts
+        self.nchunks = 0 # Number of chunks, including those with a value of 0
+        self.nvalues = 0 # Number of non-zero values
+        self.noutliers = 0 # Number of values outside the [lower, upper] limits
+        self.nbelow = 0 # Number of non-zero values below and above the histogram range
+        self.nabove = 0
+        self.sum = 0. # Sum and sum of squares of the non-zero values
+        self.sumsq = 0.
+        self.min = np.inf
+        self.max = -np.inf
+        
+        if filename is not None:
+            self.counts[:] = saved['counts']
+            for key in ['nchunks', 'nvalues', 'noutliers', 'nbelow', 'nabove', 'sum', 'sumsq', 'min', 'max']:
+                setattr(self, key, saved[key])
+    
+    def update(self, rad):
+        '''Adds an array of radiometer values, where 0 marks inf or nan values (as returned by radiometerValues)'''
+        import numpy as np
+        
+        rad = np.asarray(rad, dtype='float64').ravel()
+        values = rad[rad != 0]
+        
+        self.nchunks += len(rad)
+        self.nvalues += len(values)
+        self.noutliers += int(np.count_nonzero((values > self.upper) | (values < self.lower)))
+        self.nbelow += int(np.count_nonzero(values < self.histrange[0]))
+        self.nabove += int(np.count_nonzero(values > self.histrange[1]))
+        self.counts += np.histogram(values, bins=self.bins, range=self.histrange)[0]
+        if len(values) > 0:
+            self.sum += float(values.sum())
+            self.sumsq += float((values**2).sum())
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+    
+    def updateData(self, data, chunklen, mask=None, decfactor=128, bandwidth=0.390625 * (10**6), level=0, precision='double'):
+        '''Computes the radiometer values of a data set with radiometerValues (same arguments), and adds them'''
+        rad, outlierpercent = radiometerValues(data, chunklen, decfactor=decfactor, bandwidth=bandwidth, level=level, precision=precision, mask=mask)
+        self.update(rad)
+    
+    def merge(self, other):
+        '''Adds the counts of another accumulator with the same bins and limits (eg. from another worker), returns self'''
+        if (other.bins, other.histrange, other.upper, other.lower) != (self.bins, self.histrange, self.upper, self.lower):
+            raise ValueError('Accumulators must have the same bins, range and limits to be merged')
+        
+        self.counts += other.counts
+        for key in ['nchunks', 'nvalues', 'noutliers', 'nbelow', 'nabove', 'sum', 'sumsq']:
+            setattr(self, key, getattr(self, key) + getattr(other, key))
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+    
+    def stats(self):
+        '''Returns a dictionary of the number of chunks ('chunks') and of non-zero values ('values'), the outlier 
+        percentage ('outlierpercent', of all chunks as in radiometer), and the mean, standard deviation, minimum and 
+        maximum of the non-zero values ('mean', 'std', 'min', 'max')
+        '''
+        import numpy as np
+        
+        nvalues = max(self.nvalues, 1)
+        mean = self.sum/nvalues
+        return {'chunks': self.nchunks, 'values': self.nvalues, 
+                'outlierpercent': (np.float(self.noutliers)/max(self.nchunks, 1))*100,
+                'mean': mean, 'std': np.sqrt(max(self.sumsq/nvalues - mean**2, 0)), 'min': self.min, 'max': self.max}
+    
+    def save(self, filename):
+        '''Saves the accumulator to a JSON file, which RadiometerAccumulator(filename=filename) loads'''
+        import json
+        import os
+        
+        saved = {'bins': self.bins, 'histrange': list(self.histrange), 'upper': self.upper, 'lower': self.lower,
+                 'counts': self.counts.tolist()}
+        for key in ['nchunks', 'nvalues', 'noutliers', 'nbelow', 'nabove', 'sum', 'sumsq', 'min', 'max']:
+            saved[key] = getattr(self, key)
+        
+        # Writing to a temporary file first, so a partially written file is never left behind
+        with open(filename + '.tmp%d'%os.getpid(), 'w') as f:
+            json.dump(saved, f)
+        os.rename(filename + '.tmp%d'%os.getpid(), filename)
+
+
+
+def _unflagged(mask, dims, start=0, stop=None):
+    '''Returns the bool array of unflagged samples start:stop along the time axis (default: all of them) of a dense, 
+    packed or run-length encoded mask of shape dims, expanding only that range of a packed or run-length encoded mask'''
+    
+    # Importing modules
+    import numpy as np
+    from RFImask import PackedMask, RLEMask
+    
+    if stop is None:
+        stop = dims[1]
+    
+    if isinstance(mask, (PackedMask, RLEMask)):
+        if tuple(mask.shape) != tuple(dims):
+            raise ValueError('Mask must have the same shape as the data')
+        return ~mask.toBool(start, stop)
+    
+    if np.shape(mask) != tuple(dims):
+        raise ValueError('Mask must have the same shape as the data')
+    
+    return np.asarray(mask)[:, start:stop] == 0
 
-            print 'Outlier percentage of data set 1 using time chunks of length ', chunklen,':', data1outlierpercent
+
+
+def radiometerPlot(rads, labels, title, savefig=False):
+    '''Plots log histograms of radiometer values (eg. from radiometerValues), importing matplotlib only when called.
+    
+    Keyword arguments:
+    rads -- List of arrays of radiometer values, zeros are excluded
+    labels -- List of the legend labels of the arrays
+    title -- Title of the plot
+    savefig -- (OPTIONAL) Set to 'True' to prompt for a filename and save to the working directory, or a filename to save
+               to without prompting (default = 'False')
+    '''
+    
+    # Importing modules
+    import numpy as np
+    import matplotlib.pyplot as plt
+    from os import getcwd
+    
+    plt.figure(figsize=[10,10])
+    plt.title(title)
     
-            return
\ No newline at end of file
+    for rad, label in zip(rads, labels):
+        rad = np.asarray(rad).flatten()
+        n, bins, patches = plt.hist(rad[rad!=0], range=(0,4), bins=200, alpha=0.5, log=True, label=label)
+    plt.xlabel('Value of Radiometer Metric')
+    plt.ylabel('#')
+    plt.legend(loc='upper right')
+    
+    if isinstance(savefig, basestring): # Saving to the given file, for batch jobs
+        plt.savefig(savefig)
+        print 'File saved to %s'%(savefig)
+    elif savefig == True:
+        fname = raw_input('Enter a file name...')
+        fpath = getcwd() # Extracting working directory using os.getcwd and using this as save location
+        plt.savefig('%s/%s'%(fpath,fname))
+        print 'File saved to %s/%s.png'%(fpath,fname)
+    
+    plt.show()
+
@@ -0,0 +1,76 @@
+# In-memory copies of the on-disk tables, keyed by cache file, each a dictionary of the values already computed or loaded
+_tables = {}
+
+
+
+def cachePath(filename):
+    """Returns the default path of an on-disk table, ie. ~/.aro_rfi/filename
+    
+    Keyword arguments:
+    filename -- String, name of the table file (eg. 'SKthresholds.json')
+    
+    """
+    # Importing required modules
+    import os
+    
+    return os.path.join(os.path.expanduser('~'), '.aro_rfi', filename)
+
+
+
+def cacheLookup(cachefile, key):
+    """Returns the value stored under key in a table, or None if it has not been computed yet
+    
+    The on-disk table is loaded into memory on the first lookup, so later lookups cost O(1) and do not touch the disk.
+    
+    Keyword arguments:
+    cachefile -- String, path of the on-disk JSON table
+    key -- String, key of the value in the table
+    
+    """
+    # Importing required modules
+    import json
+    import os
+    
+    # Loading the on-disk table into memory once per cache file
+    if cachefile not in _tables:
+        _tables[cachefile] = {}
+        if os.path.exists(cachefile):
+            with open(cachefile) as f:
+                _tables[cachefile].update(json.load(f))
+    
+    return _tables[cachefile].get(key)
+
+
+
+def cacheStore(cachefile, key, value, name='table'):
+    """Stores a value under key in a table, in memory and in the on-disk JSON table
+    
+    The on-disk table is re-read before writing, so tables shared between processes are merged, and is written to a 
+    temporary file which is then renamed, so readers never see a partly written table. If the table cannot be written, 
+    the value is only cached in memory.
+    
+    Keyword arguments:
+    cachefile -- String, path of the on-disk JSON table
+    key -- String, key of the value in the table
+    value -- Value to store, must be serializable to JSON
+    name -- String, description of the table for the warning printed if it cannot be written (default = 'table')
+    
+    """
+    # Importing required modules
+    import json
+    import os
+    
+    _tables.setdefault(cachefile, {})[key] = value
+    try:
+        if not os.path.isdir(os.path.dirname(cachefile)):
+            os.makedirs(os.path.dirname(cachefile))
+        table = {}
+        if os.path.exists(cachefile):
+            with open(cachefile) as f:
+                table = json.load(f)
+        table[key] = value
+        with open(cachefile + '.tmp%d'%os.getpid(), 'w') as f:
+            json.dump(table, f)
+        os.rename(cachefile + '.tmp%d'%os.getpid(), cachefile)
+    except (IOError, OSError):
+        print 'Could not write %s to %s, values are only cached in memory'%(name, cachefile)
@@ -1,36 +1,75 @@
 # List of hard-coded frequency channels with narrow-band RFI at ARO for reference
 channelarray = [384,541,757,808,809,810,811,816,817,818,867,868,870,889,893,896,909,962]
 
-def upchannelize(Vin, channels, upfactor=128, refchannel=865): 
+# Persistent narrow-band RFI at ARO, for upfactor = 128: channel -> (clean portion used as the reference for 
+# back-filling, [portions with RFI to cut and back-fill]), as slices start:end of the up-channelized frequencies
+channeltable = {384: ((40,80), [(0,20)]),
+                541: ((45,100), [(30,45)]),
+                757: ((40,80), [(20,35)]),
+                808: ((20,60), [(75,100)]),
+                809: ((0,40), [(40,100)]),
+                810: ((70,110), [(40,60)]),
+                811: ((40,80), [(115,128)]),
+                816: ((40,80), [(0,40)]),
+                817: ((40,80), [(0,40)]),
+                818: ((40,80), [(0,40)]),
+                867: ((0,40), [(50,80),(78,85),(87,94)]),
+                868: ((15,40), [(45,90),(0,5),(120,128)]),
+                870: ((20,60), [(70,80),(82,95)]),
+                889: ((40,80), [(15,30)]),
+                893: ((40,60), [(70,90)]),
+                896: ((40,80), [(0,10)]),
+                909: ((75,100), [(25,45)]),
+                962: ((0,40), [(41,60),(85,128)])}
+
+def upchannelize(Vin, channels, upfactor=128, refchannel=865, interactive=True): 
     '''Function which uses fast fourier transforms to up-channelize frequency channels, remove RFI and then re-transforms back
     
-    The function iterates through given frequency channels, up-channelizes, then backfills RFI-affected portions with
+    The function up-channelizes the given frequency channels, then backfills RFI-affected portions with
     values pulled from a gaussian distribution based on a 'clean' portion of the data, before inverse-FFT'ing the data back 
     and replacing corrupted channels in the input data set with the cleaned channels. Persistent narrow-band RFI specific to ARO
-    is harcoded, but if a channel is given that is not hardcoded, it will prompt for user to select 'clean' portion, then the
-    portions which should be cut/backfilled. 
+    is harcoded in channeltable (these channels are cleaned together with upchannelizeBatch), but if a channel is given that 
+    is not hardcoded, it will prompt for user to select 'clean' portion, then the portions which should be cut/backfilled, 
+    or with interactive = False, pick them automatically with detectRFI (for batch jobs). 
     
     Keyword arguments:
     Vin -- Input data, must be voltages (not power) 
     channels -- List of channels which contain RFI and should be up-channelized
     upfactor -- Factor by which to up-channelize by (number of frequencies which each channel will be split into)(default = 128)
     refchannel -- A 'Clean' channel from the original data to use as a reference when re-normalizing outputted cleaned channels (default = 865)
+    interactive -- (OPTIONAL) Set to 'False' to detect the clean and RFI portions of channels which are not hard-coded 
+                   automatically instead of prompting (default = 'True')
+    
+    Returns the cleaned copy of the input voltages, and with interactive = False, also the dictionary of channel -> 
+    (clean portion, [RFI portions]) used for each channel (see upchannelizeBatch), so they can be audited or stored.
     '''
     print 'Beginning Upchannelizing...'
     
     #Importing required modules
     import numpy as np
-    import matplotlib.pyplot as plt
     
     # Reference channel, for re-scaling the cleaned output channels
     reference = Vin[:,refchannel,0]
     refpow = np.real(reference)**2. + np.imag(reference)**2.
     refmean = np.mean(refpow)
     
-    # Creating copy of input voltage array, to replace corrupted channels
-    cleanedoutput = np.copy(Vin)
+    # Without prompting, cleaning all channels at once, with the portions of the channels which are not hard-coded detected
+    if interactive == False:
+        table = channeltable if upfactor == 128 else {}
+        cleanedoutput, ranges = upchannelizeBatch(Vin, channels, upfactor, refchannel, table=table, auto=True)
+        print 'Finished Upchannelizing.'
+        return cleanedoutput, ranges
+    
+    # Cleaning all hard-coded channels at once, and creating the copy of the input voltage array otherwise
+    tabled = [channel for channel in channels if upfactor == 128 and channel in channeltable]
+    if len(tabled) > 0:
+        cleanedoutput, ranges = upchannelizeBatch(Vin, tabled, upfactor, refchannel)
+    else:
+        cleanedoutput = np.copy(Vin)
     
     for channel in channels:
+        if channel in tabled:
+            continue
         print channel
         # Selecting channel to up-channelize
         lineRFI = Vin[:,channel,0] 
@@ -41,553 +80,267 @@ def upchannelize(Vin, channels, upfactor=128, refchannel=865):
         # Creating copy of FFT output array, to backfill with gaussian data
         cleaned = np.copy(FFT)
         
-        # Hard-coding channels with persistent narrow-band RFI
-        if channel == 384 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,40:80])) # STD of both real and imaginary components for back-filling
-            Imstd = np.std(np.imag(FFT[:,40:80]))
-            Remean = np.mean(np.real(FFT[:,40:80])) # Mean of both real and imaginary components for back-filling
-            Immean = np.mean(np.imag(FFT[:,40:80]))
-            
-            # Hard-coded the backfilling of bad frequencies for corrupted channel 867
-            RFI1 = cleaned[:,0:20] 
-            dims1 = np.shape(RFI1)
-            # Generating a gaussian distribution based on Re and Im components, to back-fill with
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) 
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,0:20] = ReGauss1 + ImGauss1*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2. # Calculating power of inv, for re-normalizing
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
+        # If given channel is not hard-coded, ask user for input on clean chunk & portions to cut
+        import matplotlib.pyplot as plt
+        ddd = np.real(FFT)**2 + np.imag(FFT)**2 # Power, for displaying plot before asking for input
         
-        elif channel == 541 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,45:100])) # STD of both real and imaginary components for back-filling
-            Imstd = np.std(np.imag(FFT[:,45:100]))
-            Remean = np.mean(np.real(FFT[:,45:100])) # Mean of both real and imaginary components for back-filling
-            Immean = np.mean(np.imag(FFT[:,45:100]))
-            
-            # Hard-coded the backfilling of bad frequencies for corrupted channel 867
-            RFI1 = cleaned[:,30:45] 
-            dims1 = np.shape(RFI1)
-            # Generating a gaussian distribution based on Re and Im components, to back-fill with
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) 
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,30:45] = ReGauss1 + ImGauss1*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2. # Calculating power of inv, for re-normalizing
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-        
-        elif channel == 757 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,40:80])) # STD of both real and imaginary components for back-filling
-            Imstd = np.std(np.imag(FFT[:,40:80]))
-            Remean = np.mean(np.real(FFT[:,40:80])) # Mean of both real and imaginary components for back-filling
-            Immean = np.mean(np.imag(FFT[:,40:80]))
-            
-            # Hard-coded the backfilling of bad frequencies for corrupted channel 867
-            RFI1 = cleaned[:,20:35] 
-            dims1 = np.shape(RFI1)
-            # Generating a gaussian distribution based on Re and Im components, to back-fill with
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) 
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,20:35] = ReGauss1 + ImGauss1*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2. # Calculating power of inv, for re-normalizing
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-        
-        elif channel == 808 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,20:60])) # STD of both real and imaginary components for back-filling
-            Imstd = np.std(np.imag(FFT[:,20:60]))
-            Remean = np.mean(np.real(FFT[:,20:60])) # Mean of both real and imaginary components for back-filling
-            Immean = np.mean(np.imag(FFT[:,20:60]))
-            
-            # Hard-coded the backfilling of bad frequencies for corrupted channel 867
-            RFI1 = cleaned[:,75:100] 
-            dims1 = np.shape(RFI1)
-            # Generating a gaussian distribution based on Re and Im components, to back-fill with
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) 
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,75:100] = ReGauss1 + ImGauss1*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2. # Calculating power of inv, for re-normalizing
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-        
-        elif channel == 809 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,0:40])) # STD of both real and imaginary components for back-filling
-            Imstd = np.std(np.imag(FFT[:,0:40]))
-            Remean = np.mean(np.real(FFT[:,0:40])) # Mean of both real and imaginary components for back-filling
-            Immean = np.mean(np.imag(FFT[:,0:40]))
-            
-            # Hard-coded the backfilling of bad frequencies for corrupted channel 867
-            RFI1 = cleaned[:,40:100] 
-            dims1 = np.shape(RFI1)
-            # Generating a gaussian distribution based on Re and Im components, to back-fill with
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) 
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,40:100] = ReGauss1 + ImGauss1*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2. # Calculating power of inv, for re-normalizing
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-        
-        elif channel == 810 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,70:110])) # STD of both real and imaginary components for back-filling
-            Imstd = np.std(np.imag(FFT[:,70:110]))
-            Remean = np.mean(np.real(FFT[:,70:110])) # Mean of both real and imaginary components for back-filling
-            Immean = np.mean(np.imag(FFT[:,70:110]))
-            
-            # Hard-coded the backfilling of bad frequencies for corrupted channel 867
-            RFI1 = cleaned[:,40:60] 
-            dims1 = np.shape(RFI1)
-            # Generating a gaussian distribution based on Re and Im components, to back-fill with
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) 
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,40:60] = ReGauss1 + ImGauss1*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2. # Calculating power of inv, for re-normalizing
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-        
-        elif channel == 811 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,40:80])) # STD of both real and imaginary components for back-filling
-            Imstd = np.std(np.imag(FFT[:,40:80]))
-            Remean = np.mean(np.real(FFT[:,40:80])) # Mean of both real and imaginary components for back-filling
-            Immean = np.mean(np.imag(FFT[:,40:80]))
-            
-            # Hard-coded the backfilling of bad frequencies for corrupted channel 867
-            RFI1 = cleaned[:,115:128] 
-            dims1 = np.shape(RFI1)
-            # Generating a gaussian distribution based on Re and Im components, to back-fill with
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) 
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,115:128] = ReGauss1 + ImGauss1*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2. # Calculating power of inv, for re-normalizing
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-        
-        elif channel == 816 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,40:80])) # STD of both real and imaginary components for back-filling
-            Imstd = np.std(np.imag(FFT[:,40:80]))
-            Remean = np.mean(np.real(FFT[:,40:80])) # Mean of both real and imaginary components for back-filling
-            Immean = np.mean(np.imag(FFT[:,40:80]))
-            
-            # Hard-coded the backfilling of bad frequencies for corrupted channel 867
-            RFI1 = cleaned[:,0:40] 
-            dims1 = np.shape(RFI1)
-            # Generating a gaussian distribution based on Re and Im components, to back-fill with
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) 
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,0:40] = ReGauss1 + ImGauss1*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2. # Calculating power of inv, for re-normalizing
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-        
-        elif channel == 817 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,40:80])) # STD of both real and imaginary components for back-filling
-            Imstd = np.std(np.imag(FFT[:,40:80]))
-            Remean = np.mean(np.real(FFT[:,40:80])) # Mean of both real and imaginary components for back-filling
-            Immean = np.mean(np.imag(FFT[:,40:80]))
-            
-            # Hard-coded the backfilling of bad frequencies for corrupted channel 867
-            RFI1 = cleaned[:,0:40] 
-            dims1 = np.shape(RFI1)
-            # Generating a gaussian distribution based on Re and Im components, to back-fill with
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) 
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,0:40] = ReGauss1 + ImGauss1*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2. # Calculating power of inv, for re-normalizing
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
+        # Generating a plot of the power, so user can determine clean chunks and portions to cut
+        fig = plt.figure(figsize=[10,10])
+        plt.imshow(np.log10(ddd),aspect='auto', interpolation='none', vmin=-3,vmax=6)
+        plt.title('Up-Channelized Frequency Channel %s' %channel)
+        cbar = plt.colorbar()
+        cbar.set_label('Log_10(Power)')
+        plt.xlabel('Frequency Channel')
+        plt.ylabel('Time Sample')
+        plt.show()
         
-        elif channel == 818 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,40:80])) # STD of both real and imaginary components for back-filling
-            Imstd = np.std(np.imag(FFT[:,40:80]))
-            Remean = np.mean(np.real(FFT[:,40:80])) # Mean of both real and imaginary components for back-filling
-            Immean = np.mean(np.imag(FFT[:,40:80]))
-            
-            # Hard-coded the backfilling of bad frequencies for corrupted channel 867
-            RFI1 = cleaned[:,0:40] 
-            dims1 = np.shape(RFI1)
-            # Generating a gaussian distribution based on Re and Im components, to back-fill with
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) 
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,0:40] = ReGauss1 + ImGauss1*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2. # Calculating power of inv, for re-normalizing
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
+        while True:
+            # Asking user for input on clean portion to use as reference for back-filling
+            cleaninput = np.array(list(raw_input('Where is the clean portion for reference (use slicing notation x:y)? ')))
+            if np.all(':' in cleaninput) == False: # Raise error if user doesn't use list-slicing notation
+                print 'Improper input, please use list slicing notation --> x:y'
+                continue  # Continue to ask user for proper input until it is received
+            else: # When proper input is provided, continue
+                break
         
-        elif channel == 867 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,0:40])) # STD of both real and imaginary components for back-filling
-            Imstd = np.std(np.imag(FFT[:,0:40]))
-            Remean = np.mean(np.real(FFT[:,0:40])) # Mean of both real and imaginary components for back-filling
-            Immean = np.mean(np.imag(FFT[:,0:40]))
-            
-            # Hard-coded the backfilling of bad frequencies for corrupted channel 867
-            RFI1 = cleaned[:,50:80] 
-            dims1 = np.shape(RFI1)
-            # Generating a gaussian distribution based on Re and Im components, to back-fill with
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) 
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,50:80] = ReGauss1 + ImGauss1*1j
-            
-            RFI2 = cleaned[:,78:85] 
-            dims2 = np.shape(RFI2)
-            ReGauss2 = np.random.normal(loc=Remean,scale=Restd,size=(dims2[0],dims2[1]))
-            ImGauss2 = np.random.normal(loc=Immean,scale=Imstd,size=(dims2[0],dims2[1]))
-            cleaned[:,78:85] = ReGauss2 + ImGauss2*1j
-            
-            RFI3 = cleaned[:,87:94] 
-            dims3 = np.shape(RFI3)
-            ReGauss3 = np.random.normal(loc=Remean,scale=Restd,size=(dims3[0],dims3[1]))
-            ImGauss3 = np.random.normal(loc=Immean,scale=Imstd,size=(dims3[0],dims3[1]))
-            cleaned[:,87:94] = ReGauss3 + ImGauss3*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2. # Calculating power of inv, for re-normalizing
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
+        mid = np.where(cleaninput == ':') # Finding index where character ':' is located. 
+                                          #... this denotes the split between start and end of interval
         
-        elif channel == 868 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,15:40])) 
-            Imstd = np.std(np.imag(FFT[:,15:40]))
-            Remean = np.mean(np.real(FFT[:,15:40])) 
-            Immean = np.mean(np.imag(FFT[:,15:40]))
-            
-            # Manually backfilling bad frequencies
-            RFI1 = cleaned[:,45:90] 
-            dims1 = np.shape(RFI1) # Extracting dimensions of RFI infected chunks
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) # Pulling a Re and Im component from gaussian distribution to backfill
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,45:90] = ReGauss1 + ImGauss1*1j # Adding Re and Im components together
-            
-            RFI2 = cleaned[:,0:5]
-            dims2 = np.shape(RFI2)
-            ReGauss2 = np.random.normal(loc=Remean,scale=Restd,size=(dims2[0],dims2[1]))
-            ImGauss2 = np.random.normal(loc=Immean,scale=Imstd,size=(dims2[0],dims2[1]))
-            cleaned[:,0:5] = ReGauss2 + ImGauss2*1j
-            
-            RFI3 = cleaned[:,120:128] 
-            dims3 = np.shape(RFI3)
-            ReGauss3 = np.random.normal(loc=Remean,scale=Restd,size=(dims3[0],dims3[1]))
-            ImGauss3 = np.random.normal(loc=Immean,scale=Imstd,size=(dims3[0],dims3[1]))
-            cleaned[:,120:128] = ReGauss3 + ImGauss3*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2.
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-            
-        elif channel == 870 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,20:60])) 
-            Imstd = np.std(np.imag(FFT[:,20:60]))
-            Remean = np.mean(np.real(FFT[:,20:60])) 
-            Immean = np.mean(np.imag(FFT[:,20:60]))
-            
-            # Manually backfilling bad frequencies
-            RFI1 = cleaned[:,70:80] 
-            dims1 = np.shape(RFI1) # Extracting dimensions of RFI infected chunks
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) # Pulling a Re and Im component from gaussian distribution to backfill
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,70:80] = ReGauss1 + ImGauss1*1j # Adding Re and Im components together
-            
-            RFI2 = cleaned[:,82:95] 
-            dims2 = np.shape(RFI2)
-            ReGauss2 = np.random.normal(loc=Remean,scale=Restd,size=(dims2[0],dims2[1]))
-            ImGauss2 = np.random.normal(loc=Immean,scale=Imstd,size=(dims2[0],dims2[1]))
-            cleaned[:,82:95] = ReGauss2 + ImGauss2*1j
+        cleanstart = cleaninput[:mid[0]]
+        cleanstart = ''.join(cleanstart)
+        cleanstart = np.int(cleanstart) # Converting user input to int's for list-slicing
 
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2.
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-            
-        elif channel == 889 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,40:80])) 
-            Imstd = np.std(np.imag(FFT[:,40:80]))
-            Remean = np.mean(np.real(FFT[:,40:80])) 
-            Immean = np.mean(np.imag(FFT[:,40:80]))
-            
-            # Manually backfilling bad frequencies
-            RFI1 = cleaned[:,15:30] 
-            dims1 = np.shape(RFI1) # Extracting dimensions of RFI infected chunks
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) # Pulling a Re and Im component from gaussian distribution to backfill
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,15:30] = ReGauss1 + ImGauss1*1j # Adding Re and Im components together
-
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2.
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-            
-        elif channel == 893 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,40:60])) 
-            Imstd = np.std(np.imag(FFT[:,40:60]))
-            Remean = np.mean(np.real(FFT[:,40:60])) 
-            Immean = np.mean(np.imag(FFT[:,40:60]))
-            
-            # Manually backfilling bad frequencies
-            RFI1 = cleaned[:,70:90] 
-            dims1 = np.shape(RFI1) # Extracting dimensions of RFI infected chunks
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) # Pulling a Re and Im component from gaussian distribution to backfill
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,70:90] = ReGauss1 + ImGauss1*1j # Adding Re and Im components together
-
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2.
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-            
-        elif channel == 896 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,40:80])) 
-            Imstd = np.std(np.imag(FFT[:,40:80]))
-            Remean = np.mean(np.real(FFT[:,40:80])) 
-            Immean = np.mean(np.imag(FFT[:,40:80]))
-            
-            # Manually backfilling bad frequencies
-            RFI1 = cleaned[:,0:10] 
-            dims1 = np.shape(RFI1) # Extracting dimensions of RFI infected chunks
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) # Pulling a Re and Im component from gaussian distribution to backfill
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,0:10] = ReGauss1 + ImGauss1*1j # Adding Re and Im components together
-
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2.
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-            
-        elif channel == 909 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,75:100])) 
-            Imstd = np.std(np.imag(FFT[:,75:100]))
-            Remean = np.mean(np.real(FFT[:,75:100])) 
-            Immean = np.mean(np.imag(FFT[:,75:100]))
-            
-            # Manually backfilling bad frequencies
-            RFI1 = cleaned[:,25:45] 
-            dims1 = np.shape(RFI1) # Extracting dimensions of RFI infected chunks
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) # Pulling a Re and Im component from gaussian distribution to backfill
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,25:45] = ReGauss1 + ImGauss1*1j # Adding Re and Im components together
-
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2.
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-            
-        elif channel == 962 and upfactor == 128:
-            # Mean and Std of clean portions of the Up-channelized Sections for Backfilling
-            Restd = np.std(np.real(FFT[:,0:40])) 
-            Imstd = np.std(np.imag(FFT[:,0:40]))
-            Remean = np.mean(np.real(FFT[:,0:40])) 
-            Immean = np.mean(np.imag(FFT[:,0:40]))
-            
-            # Manually backfilling bad frequencies
-            RFI1 = cleaned[:,41:60] 
-            dims1 = np.shape(RFI1) # Extracting dimensions of RFI infected chunks
-            ReGauss1 = np.random.normal(loc=Remean,scale=Restd,size=(dims1[0],dims1[1])) # Pulling a Re and Im component from gaussian distribution to backfill
-            ImGauss1 = np.random.normal(loc=Immean,scale=Imstd,size=(dims1[0],dims1[1]))
-            cleaned[:,41:60] = ReGauss1 + ImGauss1*1j # Adding Re and Im components together
+        cleanend = cleaninput[mid[0]+1:]
+        cleanend = ''.join(cleanend)
+        cleanend = np.int(cleanend)
+        
+        # Conditions to ensure input was of correct format for list slicing
+        if cleanstart > cleanend:
+            print 'Start of interval is greater than the end'
+            continue
+        elif cleanstart < 0 or cleanend < 0:
+            print 'Input value(s) were negative'
+            continue
+        elif cleanstart == cleanend:
+            print 'Start of interval was equal to end of interval'
+            continue
 
-            RFI2 = cleaned[:,85:128] 
-            dims2 = np.shape(RFI2)
-            ReGauss2 = np.random.normal(loc=Remean,scale=Restd,size=(dims2[0],dims2[1]))
-            ImGauss2 = np.random.normal(loc=Immean,scale=Imstd,size=(dims2[0],dims2[1]))
-            cleaned[:,85:128] = ReGauss2 + ImGauss2*1j
-            
-            # Inverse FFT'ing the corrupted freq channels
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2.
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
-            
-        else: # If given channel is not hard-coded, ask user for input on clean chunk & portions to cut
-            ddd = np.real(FFT)**2 + np.imag(FFT)**2 # Power, for displaying plot before asking for input
-            
-            # Generating a plot of the power, so user can determine clean chunks and portions to cut
-            fig = plt.figure(figsize=[10,10])
-            plt.imshow(np.log10(ddd),aspect='auto', interpolation='none', vmin=-3,vmax=6)
-            plt.title('Up-Channelized Frequency Channel %s' %channel)
-            cbar = plt.colorbar()
-            cbar.set_label('Log_10(Power)')
-            plt.xlabel('Frequency Channel')
-            plt.ylabel('Time Sample')
-            plt.show()
-            
-            while True:
-                # Asking user for input on clean portion to use as reference for back-filling
-                cleaninput = np.array(list(raw_input('Where is the clean portion for reference (use slicing notation x:y)? ')))
-                if np.all(':' in cleaninput) == False: # Raise error if user doesn't use list-slicing notation
-                    print 'Improper input, please use list slicing notation --> x:y'
-                    continue  # Continue to ask user for proper input until it is received
-                else: # When proper input is provided, continue
+        # Finding the STD and mean of the clean portion provided as input
+        Restd = np.std(np.real(FFT[:,cleanstart:cleanend])) 
+        Imstd = np.std(np.imag(FFT[:,cleanstart:cleanend]))
+        Remean = np.mean(np.real(FFT[:,cleanstart:cleanend])) 
+        Immean = np.mean(np.imag(FFT[:,cleanstart:cleanend]))
+        
+        # Asking user for input on portions with RFI to cut and back-fill
+        RFIchunks = []
+        while True:
+            RFIinput = np.array(list(raw_input('Which sections would you like to cut and backfill? (use slicing notation x:y)? ')))
+            if np.all(':' in RFIinput) == False:
+                print 'Improper input, please use list slicing notation --> x:y'
+                continue
+            else:
+                RFIchunks.append(RFIinput)
+                choice = raw_input('Continue? y/n: ') # Give user option to enter more chunks to cut/backfill
+                if choice == 'y':
+                    continue
+                elif choice == 'n':    
                     break
+                else:
+                    print'Input not understood, please enter "y" or "n"'
+                    continue
+                    
+        for j in range(len(RFIchunks)):
+            mid = np.where(RFIchunks[j] == ':')
             
-            mid = np.where(cleaninput == ':') # Finding index where character ':' is located. 
-                                              #... this denotes the split between start and end of interval
-            
-            cleanstart = cleaninput[:mid[0]]
-            cleanstart = ''.join(cleanstart)
-            cleanstart = np.int(cleanstart) # Converting user input to int's for list-slicing
+            RFIstart = RFIchunks[j][:mid[0]]
+            RFIstart = ''.join(RFIstart)
+            RFIstart = np.int(RFIstart)
+
+            RFIend = RFIchunks[j][mid[0]+1:]
+            RFIend = ''.join(RFIend)
+            RFIend = np.int(RFIend)
 
-            cleanend = cleaninput[mid[0]+1:]
-            cleanend = ''.join(cleanend)
-            cleanend = np.int(cleanend)
-            
             # Conditions to ensure input was of correct format for list slicing
-            if cleanstart > cleanend:
+            if RFIstart > RFIend:
                 print 'Start of interval is greater than the end'
                 continue
-            elif cleanstart < 0 or cleanend < 0:
+            elif RFIstart < 0 or RFIend < 0:
                 print 'Input value(s) were negative'
                 continue
-            elif cleanstart == cleanend:
-                print 'Start of interval was equal to end of interval'
+            elif RFIstart == RFIend:
+                print 'Interval of improper size: size 0'
                 continue
-
-            # Finding the STD and mean of the clean portion provided as input
-            Restd = np.std(np.real(FFT[:,cleanstart:cleanend])) 
-            Imstd = np.std(np.imag(FFT[:,cleanstart:cleanend]))
-            Remean = np.mean(np.real(FFT[:,cleanstart:cleanend])) 
-            Immean = np.mean(np.imag(FFT[:,cleanstart:cleanend]))
             
-            # Asking user for input on portions with RFI to cut and back-fill
-            RFIchunks = []
-            while True:
-                RFIinput = np.array(list(raw_input('Which sections would you like to cut and backfill? (use slicing notation x:y)? ')))
-                if np.all(':' in RFIinput) == False:
-                    print 'Improper input, please use list slicing notation --> x:y'
-                    continue
-                else:
-                    RFIchunks.append(RFIinput)
-                    choice = raw_input('Continue? y/n: ') # Give user option to enter more chunks to cut/backfill
-                    if choice == 'y':
-                        continue
-                    elif choice == 'n':    
-                        break
-                    else:
-                        print'Input not understood, please enter "y" or "n"'
-                        continue
-                        
-            for j in range(len(RFIchunks)):
-                mid = np.where(RFIchunks[j] == ':')
-                
-                RFIstart = RFIchunks[j][:mid[0]]
-                RFIstart = ''.join(RFIstart)
-                RFIstart = np.int(RFIstart)
-
-                RFIend = RFIchunks[j][mid[0]+1:]
-                RFIend = ''.join(RFIend)
-                RFIend = np.int(RFIend)
-
-                # Conditions to ensure input was of correct format for list slicing
-                if RFIstart > RFIend:
-                    print 'Start of interval is greater than the end'
-                    continue
-                elif RFIstart < 0 or RFIend < 0:
-                    print 'Input value(s) were negative'
-                    continue
-                elif RFIstart == RFIend:
-                    print 'Interval of improper size: size 0'
-                    continue
-                
-                RFI = cleaned[:,RFIstart:RFIend]
-                RFIdims = np.shape(RFI)
-                ReGauss = np.random.normal(loc=Remean,scale=Restd,size=(RFIdims[0],RFIdims[1])) # Pulling a Re and Im component from gaussian distribution to backfill
-                ImGauss = np.random.normal(loc=Immean,scale=Imstd,size=(RFIdims[0],RFIdims[1]))
-                cleaned[:,RFIstart:RFIend] = ReGauss + ImGauss*1j # Adding Re and Im components together
-            
-            # Inverse FFT'ing the corrupted freq channel
-            inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape([65536,-1])
-            pow = np.real(inv)**2. + np.imag(inv)**2.
-            invmean = np.mean(pow)
-            
-            # Replacing old channels with new cleaned ones
-            cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
+            RFI = cleaned[:,RFIstart:RFIend]
+            RFIdims = np.shape(RFI)
+            ReGauss = np.random.normal(loc=Remean,scale=Restd,size=(RFIdims[0],RFIdims[1])) # Pulling a Re and Im component from gaussian distribution to backfill
+            ImGauss = np.random.normal(loc=Immean,scale=Imstd,size=(RFIdims[0],RFIdims[1]))
+            cleaned[:,RFIstart:RFIend] = ReGauss + ImGauss*1j # Adding Re and Im components together
+        
+        # Inverse FFT'ing the corrupted freq channel
+        inv = np.fft.ifft(np.squeeze(cleaned),axis=1).reshape(-1)
+        pow = np.real(inv)**2. + np.imag(inv)**2.
+        invmean = np.mean(pow)
+        
+        # Replacing old channels with new cleaned ones
+        cleanedoutput[:,channel,0] = np.squeeze(np.sqrt(refmean/invmean)*inv)
             
     print 'Finished Upchannelizing.' # For testing purposes
-    return cleanedoutput
\ No newline at end of file
+    return cleanedoutput
+
+
+
+def upchannelizeBatch(Vin, channels, upfactor=128, refchannel=865, table=None, polar=0, auto=False, threshold=5., pad=1):
+    '''Up-channelizes and cleans several frequency channels at once, using a table of clean and RFI portions
+    
+    All channels are gathered into one array of shape (blocks, channels, upfactor), transformed with a single batched FFT,
+    back-filled at once (each channel's RFI portions with gaussian values matching the mean and STD of the real and 
+    imaginary parts of its clean portion), transformed back with a single batched inverse FFT, and re-normalized to the 
+    mean power of the reference channel.
+    
+    Keyword arguments:
+    Vin -- Input data, must be voltages (not power) of shape (time, frequency, polarization)
+    channels -- List of channels which contain RFI and should be up-channelized
+    upfactor -- Factor by which to up-channelize by (number of frequencies which each channel will be split into)(default = 128)
+    refchannel -- A 'Clean' channel from the original data to use as a reference when re-normalizing outputted cleaned channels (default = 865)
+    table -- (OPTIONAL) Dictionary of channel -> (clean portion, [RFI portions]), as (start, end) tuples, default uses 
+             channeltable (for upfactor = 128) (default = None)
+    polar -- (OPTIONAL) Polarization to clean (default = 0)
+    auto -- (OPTIONAL) Set to 'True' to detect the portions of channels which are not in the table with detectRFI, 
+            instead of raising an error (default = 'False')
+    threshold -- (OPTIONAL) Detection threshold in units of the robust standard deviation, see detectRFI (default = 5)
+    pad -- (OPTIONAL) Number of bins added on each side of detected RFI portions, see detectRFI (default = 1)
+    
+    Returns:
+    cleanedoutput -- Copy of the input voltages, with the given channels cleaned
+    ranges -- Dictionary of channel -> (clean portion, [RFI portions]) used for each channel
+    '''
+    print 'Beginning batched Upchannelizing...'
+    
+    #Importing required modules
+    import numpy as np
+    
+    if table is None:
+        if upfactor != 128:
+            raise ValueError('The hard-coded channel table is for upfactor = 128, provide a table for other factors')
+        table = channeltable
+    
+    missing = [channel for channel in channels if channel not in table]
+    if len(missing) > 0 and auto == False:
+        raise ValueError('No clean and RFI portions for channels %s'%(missing))
+    if np.shape(Vin)[0]%upfactor != 0:
+        raise ValueError('Upfactor is not a proper fraction of the data length')
+    
+    channels = list(channels)
+    nchan = len(channels)
+    
+    # Reference channel, for re-scaling the cleaned output channels
+    reference = Vin[:,refchannel,polar]
+    refmean = np.mean(np.real(reference)**2. + np.imag(reference)**2.)
+    
+    # Creating copy of input voltage array, to replace corrupted channels
+    cleanedoutput = np.copy(Vin)
+    if nchan == 0:
+        return cleanedoutput, {}
+    
+    # Gathering the channels into (blocks, channels, upfactor), and performing a single FFT
+    lines = np.transpose(Vin[:,channels,polar]).reshape([nchan,-1,upfactor])
+    FFT = np.fft.fft(np.transpose(lines,(1,0,2)),axis=2)
+    
+    # Portions of every channel, from the table or detected in its up-channelized spectrum
+    ranges = {}
+    for i,channel in enumerate(channels):
+        if channel in table:
+            ranges[channel] = table[channel]
+        else:
+            ranges[channel] = detectRFI(FFT[:,i,:], threshold, pad, channel)
+            print 'Detected portions of channel', channel, ': clean', ranges[channel][0], ', RFI', ranges[channel][1]
+    
+    # Masks of the clean and RFI portions of every channel
+    cleanmask = np.zeros((nchan,upfactor),dtype=bool)
+    RFImask = np.zeros((nchan,upfactor),dtype=bool)
+    for i,channel in enumerate(channels):
+        clean, RFIs = ranges[channel]
+        cleanmask[i,clean[0]:clean[1]] = True
+        for RFIstart, RFIend in RFIs:
+            RFImask[i,RFIstart:RFIend] = True
+    
+    # Mean and Std of the real and imaginary components of the clean portions of every channel
+    count = np.shape(FFT)[0]*cleanmask.sum(axis=1)
+    Remean = np.einsum('bcf,cf->c', np.real(FFT), cleanmask)/count
+    Immean = np.einsum('bcf,cf->c', np.imag(FFT), cleanmask)/count
+    Restd = np.sqrt(np.einsum('bcf,cf->c', (np.real(FFT) - Remean[:,np.newaxis])**2, cleanmask)/count)
+    Imstd = np.sqrt(np.einsum('bcf,cf->c', (np.imag(FFT) - Immean[:,np.newaxis])**2, cleanmask)/count)
+    
+    # Back-filling the RFI portions of all channels at once with gaussian values
+    chanidx, freqidx = np.nonzero(RFImask)
+    size = (np.shape(FFT)[0], len(chanidx))
+    ReGauss = np.random.normal(loc=Remean[chanidx], scale=Restd[chanidx], size=size)
+    ImGauss = np.random.normal(loc=Immean[chanidx], scale=Imstd[chanidx], size=size)
+    FFT[:,chanidx,freqidx] = ReGauss + ImGauss*1j
+    
+    # Single inverse FFT, back to (channels, time)
+    inv = np.transpose(np.fft.ifft(FFT,axis=2),(1,0,2)).reshape([nchan,-1])
+    invmean = np.mean(np.real(inv)**2. + np.imag(inv)**2., axis=1) # Mean power of each channel, for re-normalizing
+    
+    # Replacing old channels with new cleaned ones
+    cleanedoutput[:,channels,polar] = np.transpose(np.sqrt(refmean/invmean)[:,np.newaxis]*inv)
+    
+    print 'Finished batched Upchannelizing.'
+    return cleanedoutput, ranges
+
+
+
+def detectRFI(FFT, threshold=5., pad=1, channel=None):
+    '''Detects the portions of an up-channelized frequency channel with narrow-band RFI, and a clean reference portion
+    
+    The spectrum of the channel is estimated robustly as the median power over time of every up-channelized frequency, 
+    so intermittent bursts do not bias it. Frequencies whose median power exceeds the median of the spectrum by more than 
+    threshold times the robust standard deviation (1.4826*MAD across frequencies) are RFI. Adjacent RFI frequencies are 
+    grouped into portions (widened by pad bins on each side, to cover the leakage of the lines), and the longest run of 
+    frequencies without RFI is the clean reference portion.
+    
+    Keyword arguments:
+    FFT -- Up-channelized channel, complex array of shape (time, upfactor), eg. np.fft.fft(V.reshape([-1,upfactor]),axis=1)
+    threshold -- (OPTIONAL) Detection threshold in units of the robust standard deviation (default = 5)
+    pad -- (OPTIONAL) Number of bins added on each side of the RFI portions, unless that would leave no clean frequencies
+           (eg. a comb of lines), in which case the portions are not padded (default = 1)
+    channel -- (OPTIONAL) Number of the frequency channel, for messages (default = None)
+    
+    Returns:
+    clean -- (start, end) of the clean portion
+    RFIs -- List of (start, end) of the RFI portions, empty if none were found
+    '''
+    
+    #Importing required modules
+    import numpy as np
+    
+    spectrum = np.median(np.real(FFT)**2. + np.imag(FFT)**2., axis=0) # Median power of each frequency over time
+    
+    # Robust threshold from the median and MAD of the spectrum across frequencies
+    med = np.median(spectrum)
+    sigma = 1.4826*np.median(np.abs(spectrum - med))
+    flagged = spectrum > med + threshold*sigma
+    
+    # Widening the flagged frequencies by pad bins on each side, as long as some clean frequencies are left
+    if pad > 0 and np.any(flagged):
+        padded = np.convolve(flagged.astype(int), np.ones(2*pad+1, dtype=int), mode='same') > 0
+        if np.all(padded):
+            print 'Padding the RFI portions of channel %s leaves no clean frequencies, using unpadded portions'%(channel)
+        else:
+            flagged = padded
+    
+    # The median frequency is never above the threshold, so this only guards against an empty or non-finite spectrum
+    if np.all(flagged):
+        raise ValueError('No clean frequencies found in up-channelized channel %s'%(channel))
+    
+    # Grouping the flagged frequencies into portions, and finding the longest clean run
+    edges = np.diff(np.concatenate(([0], flagged.astype(int), [0])))
+    RFIs = [(int(start), int(end)) for start, end in zip(np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0])]
+    
+    edges = np.diff(np.concatenate(([0], (~flagged).astype(int), [0])))
+    starts, ends = np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]
+    longest = np.argmax(ends - starts)
+    clean = (int(starts[longest]), int(ends[longest]))
+    
+    return clean, RFIs